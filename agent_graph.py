@@ -1,102 +1,134 @@
 import os
-from typing import Dict, List, Any, Annotated, TypedDict, Literal
+from typing import Dict, List, Any, Annotated, Literal, Optional
+from dataclasses import dataclass, field
+from pydantic import BaseModel, ValidationError
 from dotenv import load_dotenv
 from langchain_groq import ChatGroq
-from langchain_core.messages import HumanMessage, SystemMessage
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.messages import SystemMessage
+from langchain_core.prompts import ChatPromptTemplate, HumanMessagePromptTemplate, MessagesPlaceholder
 from langchain_core.output_parsers import JsonOutputParser
 from langgraph.graph import StateGraph, END
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from tenacity import retry, stop_after_attempt, wait_exponential_jitter
 import json
+import operator
+import re
+import orjson
+import asyncio
+import hashlib
+from collections import OrderedDict
 
 # Load environment variables
 load_dotenv()
 
+# Maximum number of tickets processed concurrently, to stay within Groq rate limits
+MAX_CONCURRENT_TICKETS = int(os.getenv("MAX_CONCURRENT_TICKETS", "16"))
+
+# Number of tickets packed into a single prompt by process_tickets_batched
+PLAN_BATCH_SIZE = int(os.getenv("PLAN_BATCH_SIZE", "8"))
+
+# Maximum number of ticket plans memoized by content hash
+PLAN_CACHE_SIZE = int(os.getenv("PLAN_CACHE_SIZE", "2048"))
+
+# Output token budget for one ticket plan; a plan is a small JSON object
+PLAN_MAX_TOKENS = int(os.getenv("PLAN_MAX_TOKENS", "384"))
+
+# Shared LLM client, reused by every node instead of being rebuilt per ticket
+_LLM = ChatGroq(model=os.getenv("LLM_MODEL", "llama3-70b-8192"), temperature=0, max_tokens=PLAN_MAX_TOKENS)
+
+# Smaller model for routine tickets, whose plan is mostly a classification
+_SMALL_LLM = ChatGroq(model=os.getenv("ANALYZER_MODEL", "llama-3.1-8b-instant"), temperature=0, max_tokens=PLAN_MAX_TOKENS)
+
+# Tickets at or above this FreshService priority (3 = High) are planned by the large model
+LARGE_MODEL_MIN_PRIORITY = int(os.getenv("LARGE_MODEL_MIN_PRIORITY", "3"))
+
+# FreshService group that alerts matched by the fast rules are escalated to (1 = Cloud Infrastructure)
+ESCALATION_GROUP_ID = int(os.getenv("ESCALATION_GROUP_ID", "1"))
+
 # FreshService API configuration
 API_KEY = os.getenv("FRESHSERVICE_API_KEY")
 DOMAIN = os.getenv("FRESHSERVICE_DOMAIN")
 BASE_URL = f"https://{DOMAIN}/api/v2/tickets"
-auth = (API_KEY, "X")
 
-# Define the state
-class AgentState(TypedDict):
+# Shared HTTP session so ticket updates and notes reuse pooled keep-alive connections.
+# Rate limits and transient server errors on the idempotent requests are retried
+# with exponential backoff, waiting for Retry-After when FreshService sends it;
+# notes are POSTed once, as a retried note may already have been added. Once
+# retries are exhausted the last response is returned so finalize reports the
+# failure instead of raising.
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=20,
+    pool_maxsize=50,
+    max_retries=Retry(
+        total=5,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET", "PUT"],
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+))
+SESSION.auth = (API_KEY, "X")
+SESSION.headers.update({"Content-Type": "application/json"})
+
+# Define the state; slots avoid a per-instance __dict__ when many tickets are in flight
+@dataclass(slots=True)
+class AgentState:
     ticket: Dict[str, Any]
-    analysis: Dict[str, Any]
-    action: Dict[str, Any]
-    history: List[Dict[str, Any]]
-    final_response: Dict[str, Any]
+    analysis: Dict[str, Any] = field(default_factory=dict)
+    action: Dict[str, Any] = field(default_factory=dict)
+    # History entries from each node are appended rather than overwritten
+    history: Annotated[List[Dict[str, Any]], operator.add] = field(default_factory=list)
+    update_status: Optional[int] = None
+    note_status: Optional[int] = None
+    final_response: Dict[str, Any] = field(default_factory=dict)
 
-# Define the nodes for our agent graph
-def analyzer(state: AgentState) -> AgentState:
-    """Analyze the ticket and determine what action to take"""
-    ticket = state["ticket"]
-    
-    # Create the LLM
-    llm = ChatGroq(model=os.getenv("LLM_MODEL", "llama3-70b-8192"), temperature=0)
-    
-    # Create the prompt
-    system_prompt = """You are an expert cloud support analyst. Your job is to analyze cloud support tickets and determine the best course of action.
+# Structured output schemas for the LLM
+class AnalysisSchema(BaseModel):
+    severity: int
+    category: str
+    is_known_issue: bool
+    needs_escalation: bool
+    recommended_action: Literal["resolve", "update", "escalate", "investigate"]
+    reasoning: str
+
+class ActionSchema(BaseModel):
+    action_type: Literal["resolve", "update", "escalate", "investigate"]
+    status: Optional[int] = None
+    priority: Optional[int] = None
+    note: Optional[str] = None
+    group_id: Optional[int] = None
+
+class TicketPlanSchema(BaseModel):
+    analysis: AnalysisSchema
+    action: ActionSchema
+
+class BatchTicketPlanSchema(TicketPlanSchema):
+    id: int
+
+class BatchPlanSchema(BaseModel):
+    plans: List[BatchTicketPlanSchema]
+
+# Constrain the model to emit a JSON object (Groq JSON mode); replies are
+# validated against the schemas above. Generation also stops at a code fence or
+# a run of blank lines, which only ever follow the object.
+_PLAN_STOP = ["```", "\n\n\n"]
+_JSON_LLM = _LLM.bind(response_format={"type": "json_object"}, stop=_PLAN_STOP)
+_SMALL_JSON_LLM = _SMALL_LLM.bind(response_format={"type": "json_object"}, stop=_PLAN_STOP)
+
+# Prompts
+PLAN_SYSTEM_PROMPT = """You are an expert cloud support analyst and resolution system. Your job is to analyze cloud support tickets and determine the specific action to take on them.
     
-    Based on the ticket information provided, analyze:
+    The user message is a JSON object describing the ticket. Based on it, analyze:
     1. The severity and priority of the issue
     2. What category the issue falls into (e.g., server down, performance issue, access problem)
     3. Whether this is a known issue with a standard resolution
     4. Whether this needs escalation to a specialized team
     
-    Provide your analysis in a JSON format with the following fields:
-    - severity: A number from 1-5, where 5 is most severe
-    - category: The category of the issue
-    - is_known_issue: true/false
-    - needs_escalation: true/false
-    - recommended_action: "resolve", "update", "escalate", or "investigate"
-    - reasoning: Your reasoning for the recommended action
-    """
-    
-    prompt = ChatPromptTemplate.from_messages([
-        SystemMessage(content=system_prompt),
-        HumanMessage(content=f"""
-        Ticket ID: {ticket.get('id')}
-        Subject: {ticket.get('subject')}
-        Description: {ticket.get('description', 'No description provided')}
-        Status: {ticket.get('status')}
-        Priority: {ticket.get('priority')}
-        Created At: {ticket.get('created_at')}
-        Updated At: {ticket.get('updated_at')}
-        """)
-    ])
-    
-    # Get the analysis
-    response = llm.invoke(prompt)
-    
-    # Parse the response
-    try:
-        analysis = json.loads(response.content)
-    except:
-        # Fallback if JSON parsing fails
-        analysis = {
-            "severity": ticket.get("priority", 3),
-            "category": "unknown",
-            "is_known_issue": False,
-            "needs_escalation": False,
-            "recommended_action": "investigate",
-            "reasoning": "Failed to parse analysis response"
-        }
-    
-    # Update the state
-    return {**state, "analysis": analysis}
-
-def action_planner(state: AgentState) -> AgentState:
-    """Plan the action to take based on the analysis"""
-    ticket = state["ticket"]
-    analysis = state["analysis"]
-    
-    # Create the LLM
-    llm = ChatGroq(model=os.getenv("LLM_MODEL", "llama3-70b-8192"), temperature=0)
-    
-    # Create the prompt
-    system_prompt = """You are an expert cloud support resolution system. Your job is to determine the specific action to take on a ticket based on analysis.
-    
-    For each action type, provide the necessary details:
+    Then decide on the action and provide the necessary details:
     
     1. If resolving:
        - Provide a resolution note explaining what was done
@@ -115,186 +147,373 @@ def action_planner(state: AgentState) -> AgentState:
        - Provide a note on what additional information is needed
        - Keep the ticket in its current state
     
-    Provide your action plan in a JSON format with the following fields:
-    - action_type: "resolve", "update", "escalate", or "investigate"
-    - status: The new status code (if changing)
-    - priority: The new priority (if changing)
-    - note: The note to add to the ticket
-    - group_id: The group to escalate to (if escalating)
+    Provide your response as a single JSON object with two fields:
+    - analysis: an object with the following fields:
+      - severity: A number from 1-5, where 5 is most severe
+      - category: The category of the issue
+      - is_known_issue: true/false
+      - needs_escalation: true/false
+      - recommended_action: "resolve", "update", "escalate", or "investigate"
+      - reasoning: Your reasoning for the recommended action
+    - action: an object with the following fields:
+      - action_type: "resolve", "update", "escalate", or "investigate"
+      - status: The new status code (if changing)
+      - priority: The new priority (if changing)
+      - note: The note to add to the ticket
+      - group_id: The group to escalate to (if escalating)
     """
+
+BATCH_PLAN_SYSTEM_PROMPT = PLAN_SYSTEM_PROMPT + """
+    In this request the user message is a JSON array of such ticket objects. Instead of a single object, respond with a JSON object
+    with one field "plans": a list containing one entry per ticket, each with the ticket's "id" and the
+    "analysis" and "action" objects described above.
+    """
+
+# Ticket fields sent to the LLM
+PLAN_TICKET_FIELDS = ("id", "subject", "description", "status", "priority", "created_at", "updated_at")
+
+# Prompt templates are built once and only formatted per ticket
+_PLAN_PROMPT = ChatPromptTemplate.from_messages([
+    SystemMessage(content=PLAN_SYSTEM_PROMPT),
+    HumanMessagePromptTemplate.from_template("{ticket}")
+])
+_BATCH_PLAN_PROMPT = ChatPromptTemplate.from_messages([
+    SystemMessage(content=BATCH_PLAN_SYSTEM_PROMPT),
+    HumanMessagePromptTemplate.from_template("{tickets}")
+])
+
+def _ticket_payload(ticket: Dict[str, Any]) -> Dict[str, Any]:
+    """Select the non-null ticket fields for the prompt, keeping input tokens to a minimum"""
+    return {name: ticket.get(name) for name in PLAN_TICKET_FIELDS if ticket.get(name) is not None}
+
+# LRU cache of ticket plans keyed by a hash of the ticket content, stored as
+# serialized JSON so every hit hands out fresh dicts
+_PLAN_CACHE: "OrderedDict[str, bytes]" = OrderedDict()
+
+def _plan_cache_key(ticket: Dict[str, Any]) -> str:
+    """Hash the ticket fields that determine its analysis and action"""
+    content = f"{ticket.get('subject')}|{ticket.get('description')}|{ticket.get('status')}|{ticket.get('priority')}"
+    return hashlib.sha256(content.encode()).hexdigest()
+
+def _get_cached_plan(key: str) -> Optional[Dict[str, Any]]:
+    """Return a previously computed plan for identical ticket content, if any"""
+    cached = _PLAN_CACHE.get(key)
+    if cached is None:
+        return None
+    _PLAN_CACHE.move_to_end(key)
+    return orjson.loads(cached)
+
+def _store_plan(key: str, analysis: Dict[str, Any], action: Dict[str, Any]):
+    """Memoize a plan, evicting the least recently used entry when full"""
+    _PLAN_CACHE[key] = orjson.dumps({"analysis": analysis, "action": action})
+    _PLAN_CACHE.move_to_end(key)
+    if len(_PLAN_CACHE) > PLAN_CACHE_SIZE:
+        _PLAN_CACHE.popitem(last=False)
+
+# Digest of the last note posted to each ticket, kept across runs so a ticket
+# re-polled with an unchanged plan doesn't get the same note again
+_LAST_NOTES: "OrderedDict[Any, str]" = OrderedDict()
+
+def _note_digest(note: str) -> str:
+    return hashlib.sha256(note.encode()).hexdigest()
+
+def _record_note(ticket_id: Any, note: str):
+    """Remember the note posted to a ticket, evicting the least recently noted ticket when full"""
+    _LAST_NOTES[ticket_id] = _note_digest(note)
+    _LAST_NOTES.move_to_end(ticket_id)
+    if len(_LAST_NOTES) > PLAN_CACHE_SIZE:
+        _LAST_NOTES.popitem(last=False)
+
+# Retry transient Groq failures (rate limits, dropped connections) with jittered backoff
+@retry(stop=stop_after_attempt(4), wait=wait_exponential_jitter(), reraise=True)
+async def _astream_json(prompt, llm=_JSON_LLM) -> str:
+    """Stream the LLM reply and stop as soon as the top-level JSON object closes
     
-    prompt = ChatPromptTemplate.from_messages([
-        SystemMessage(content=system_prompt),
-        HumanMessage(content=f"""
-        Ticket ID: {ticket.get('id')}
-        Subject: {ticket.get('subject')}
-        Description: {ticket.get('description', 'No description provided')}
-        Current Status: {ticket.get('status')}
-        Current Priority: {ticket.get('priority')}
-        
-        Analysis:
-        Severity: {analysis.get('severity')}
-        Category: {analysis.get('category')}
-        Is Known Issue: {analysis.get('is_known_issue')}
-        Needs Escalation: {analysis.get('needs_escalation')}
-        Recommended Action: {analysis.get('recommended_action')}
-        Reasoning: {analysis.get('reasoning')}
-        """)
-    ])
-    
-    # Get the action plan
-    response = llm.invoke(prompt)
-    
-    # Parse the response
+    Anything the model would generate after the closing brace is never decoded,
+    so trailing prose costs nothing.
+    """
+    parts = []
+    depth = 0
+    in_string = False
+    escaped = False
+    
+    stream = llm.astream(prompt)
     try:
-        action = json.loads(response.content)
-    except:
-        # Fallback if JSON parsing fails
-        action = {
-            "action_type": "investigate",
-            "note": "Additional investigation is needed for this ticket.",
-            "status": ticket.get("status")  # Keep current status
+        async for chunk in stream:
+            text = chunk.content
+            for i, char in enumerate(text):
+                if in_string:
+                    if escaped:
+                        escaped = False
+                    elif char == "\\":
+                        escaped = True
+                    elif char == '"':
+                        in_string = False
+                elif char == '"':
+                    in_string = True
+                elif char == "{":
+                    depth += 1
+                elif char == "}":
+                    depth -= 1
+                    if depth == 0:
+                        parts.append(text[:i + 1])
+                        return "".join(parts)
+            parts.append(text)
+    finally:
+        # Closing the stream cancels the rest of the generation
+        await stream.aclose()
+    
+    return "".join(parts)
+
+# Rules for well-known alert patterns, checked before any LLM call. Each maps a
+# pattern over the ticket subject to a canned plan, which assigns the ticket to
+# ESCALATION_GROUP_ID and raises its priority (3 = High, 4 = Urgent). The
+# patterns only allow a few plain words between the metric and its value, so a
+# value belonging to a different metric in the same subject doesn't match.
+_FAST_RULES = [
+    (
+        re.compile(r"\bcpu\W+(?:[a-z]+\W+){0,3}?(?:9[0-9]|100)(?:\.\d+)?\s*%", re.I),
+        {
+            "severity": 4,
+            "category": "performance",
+            "is_known_issue": True,
+            "needs_escalation": True,
+            "recommended_action": "escalate",
+            "reasoning": "Sustained CPU utilisation above 90% matches a known performance alert"
+        },
+        {
+            "action_type": "escalate",
+            "status": 2,
+            "priority": 3,
+            "group_id": ESCALATION_GROUP_ID,
+            "note": "High CPU utilisation detected. Escalated for investigation of the consuming processes."
+        }
+    ),
+    (
+        re.compile(r"\bdisk\W+(?:[a-z]+\W+){0,3}?(?:full\b|(?:9[0-9]|100)(?:\.\d+)?\s*%)|no space left on device", re.I),
+        {
+            "severity": 4,
+            "category": "storage",
+            "is_known_issue": True,
+            "needs_escalation": True,
+            "recommended_action": "escalate",
+            "reasoning": "Disk nearly or completely full matches a known storage alert"
+        },
+        {
+            "action_type": "escalate",
+            "status": 2,
+            "priority": 3,
+            "group_id": ESCALATION_GROUP_ID,
+            "note": "Disk space is critically low. Escalated to free up or extend storage."
         }
+    ),
+    (
+        # Words in between may be host names, but not "slow", as in "slowed down"
+        re.compile(
+            r"\b(?:service|server|host|site)\W+(?:(?!slow)[\w.-]+\W+){0,3}?(?:down|unreachable|not responding)\b",
+            re.I
+        ),
+        {
+            "severity": 5,
+            "category": "availability",
+            "is_known_issue": True,
+            "needs_escalation": True,
+            "recommended_action": "escalate",
+            "reasoning": "A service or host reported as down matches a known availability alert"
+        },
+        {
+            "action_type": "escalate",
+            "status": 2,
+            "priority": 4,
+            "group_id": ESCALATION_GROUP_ID,
+            "note": "Service reported as down. Escalated for immediate attention."
+        }
+    ),
+]
+
+# Recovery notifications repeat the alert's wording and must not be escalated
+_RECOVERY_RE = re.compile(r"\b(?:resolved|recovered|recovery|cleared|back (?:up|online)|normal)\b", re.I)
+
+def _match_fast_rule(ticket: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Return the canned plan of the first rule matching the ticket subject, if any"""
+    subject = ticket.get('subject') or ''
+    if _RECOVERY_RE.search(subject):
+        return None
+    for pattern, analysis, action in _FAST_RULES:
+        if pattern.search(subject):
+            # Copies, so the node outputs never alias the shared rule table
+            return {"analysis": dict(analysis), "action": dict(action)}
+    return None
+
+def _planner_for(ticket: Dict[str, Any]):
+    """Pick the model for a ticket: routine tickets go to the small model"""
+    priority = ticket.get("priority")
+    if isinstance(priority, int) and priority < LARGE_MODEL_MIN_PRIORITY:
+        return _SMALL_JSON_LLM
+    return _JSON_LLM
+
+# Define the nodes for our agent graph
+def fast_router(state: AgentState) -> AgentState:
+    """Plan well-known alerts from the rule table without calling the LLM"""
+    # Tickets planned ahead of time already have an action
+    if state.action:
+        return {}
+    
+    plan = _match_fast_rule(state.ticket)
+    return plan or {}
+
+def _route_after_fast_router(state: AgentState):
+    """Go straight to the update and note branches when a plan is already set"""
+    if state.action:
+        return ["update_ticket", "post_note"]
+    return "analyze_and_plan"
+
+def _fallback_plan(ticket: Dict[str, Any]) -> Dict[str, Any]:
+    """Plan an investigation for a ticket whose plan reply couldn't be parsed,
+    e.g. one cut off by the output token budget"""
+    action = {
+        "action_type": "investigate",
+        "note": "Additional investigation is needed for this ticket."
+    }
+    if ticket.get("status") is not None:
+        action["status"] = ticket["status"]  # Keep current status
+    return {
+        "analysis": {
+            "severity": ticket.get("priority", 3),
+            "category": "unknown",
+            "is_known_issue": False,
+            "needs_escalation": False,
+            "recommended_action": "investigate",
+            "reasoning": "Failed to parse analysis response"
+        },
+        "action": action
+    }
+
+async def analyze_and_plan(state: AgentState) -> AgentState:
+    """Analyze the ticket and plan the action to take in a single LLM call"""
+    ticket = state.ticket
+    
+    # Reuse the plan of an identical ticket, e.g. a repeated templated alert
+    cache_key = _plan_cache_key(ticket)
+    cached = _get_cached_plan(cache_key)
+    if cached is not None:
+        return {"analysis": cached["analysis"], "action": cached["action"]}
+    
+    # Create the prompt
+    prompt = _PLAN_PROMPT.format_messages(ticket=orjson.dumps(_ticket_payload(ticket)).decode())
+    
+    # Get the analysis and action plan; a malformed or truncated reply falls
+    # back to an investigation, which is not cached so the ticket is replanned
+    try:
+        plan = TicketPlanSchema.model_validate_json(await _astream_json(prompt, _planner_for(ticket)))
+    except ValidationError:
+        return _fallback_plan(ticket)
+    
+    # Drop unset optional fields so only real changes are sent to FreshService
+    analysis = plan.analysis.model_dump(exclude_none=True)
+    action = plan.action.model_dump(exclude_none=True)
+    _store_plan(cache_key, analysis, action)
     
     # Update the state
-    return {**state, "action": action}
+    return {"analysis": analysis, "action": action}
 
-def execute_action(state: AgentState) -> AgentState:
-    """Execute the planned action on the ticket"""
-    ticket = state["ticket"]
-    action = state["action"]
-    
-    ticket_id = ticket.get("id")
+def _build_ticket_update(action: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the ticket update payload for the planned action"""
     action_type = action.get("action_type")
+    update_data = {}
     
-    # Prepare the API request based on action type
     if action_type == "resolve":
         # Resolve the ticket
-        update_data = {
-            "status": action.get("status", 4)  # Default to Resolved (4)
-        }
-        
-        # Make the API request
-        url = f"{BASE_URL}/{ticket_id}"
-        response = requests.put(
-            url, 
-            auth=auth, 
-            headers={"Content-Type": "application/json"}, 
-            data=json.dumps(update_data)
-        )
-        
-        # Add resolution note
-        if "note" in action and action["note"]:
-            note_url = f"{BASE_URL}/{ticket_id}/notes"
-            note_data = {
-                "body": action["note"],
-                "private": False
-            }
-            note_response = requests.post(
-                note_url,
-                auth=auth,
-                headers={"Content-Type": "application/json"},
-                data=json.dumps(note_data)
-            )
+        update_data["status"] = action.get("status", 4)  # Default to Resolved (4)
     
     elif action_type == "update":
         # Update the ticket
-        update_data = {}
         if "status" in action:
             update_data["status"] = action["status"]
         if "priority" in action:
             update_data["priority"] = action["priority"]
-        
-        # Make the API request if there are updates
-        if update_data:
-            url = f"{BASE_URL}/{ticket_id}"
-            response = requests.put(
-                url, 
-                auth=auth, 
-                headers={"Content-Type": "application/json"}, 
-                data=json.dumps(update_data)
-            )
-        
-        # Add update note
-        if "note" in action and action["note"]:
-            note_url = f"{BASE_URL}/{ticket_id}/notes"
-            note_data = {
-                "body": action["note"],
-                "private": False
-            }
-            note_response = requests.post(
-                note_url,
-                auth=auth,
-                headers={"Content-Type": "application/json"},
-                data=json.dumps(note_data)
-            )
     
     elif action_type == "escalate":
         # Escalate the ticket
-        update_data = {}
         if "group_id" in action:
             update_data["group_id"] = action["group_id"]
         if "status" in action:
             update_data["status"] = action["status"]
-        
-        # Make the API request
-        url = f"{BASE_URL}/{ticket_id}"
-        response = requests.put(
-            url, 
-            auth=auth, 
-            headers={"Content-Type": "application/json"}, 
-            data=json.dumps(update_data)
-        )
-        
-        # Add escalation note
-        if "note" in action and action["note"]:
-            note_url = f"{BASE_URL}/{ticket_id}/notes"
-            note_data = {
-                "body": action["note"],
-                "private": False
-            }
-            note_response = requests.post(
-                note_url,
-                auth=auth,
-                headers={"Content-Type": "application/json"},
-                data=json.dumps(note_data)
-            )
-    
-    elif action_type == "investigate":
-        # Just add a note for investigation
-        if "note" in action and action["note"]:
-            note_url = f"{BASE_URL}/{ticket_id}/notes"
-            note_data = {
-                "body": action["note"],
-                "private": True  # Internal note
-            }
-            note_response = requests.post(
-                note_url,
-                auth=auth,
-                headers={"Content-Type": "application/json"},
-                data=json.dumps(note_data)
-            )
+        if "priority" in action:
+            update_data["priority"] = action["priority"]
+    
+    # Investigations keep the ticket in its current state
+    return update_data
+
+async def update_ticket(state: AgentState) -> AgentState:
+    """Apply the planned status/priority/group change to the ticket"""
+    ticket_id = state.ticket.get("id")
+    action = state.action
+    
+    update_data = _build_ticket_update(action)
+    
+    # Resolve and escalate always update the ticket; updates only when something changed
+    if not update_data and action.get("action_type") not in ("resolve", "escalate"):
+        return {"update_status": None}
+    
+    # Make the API request
+    url = f"{BASE_URL}/{ticket_id}"
+    response = await asyncio.to_thread(SESSION.put, url, data=orjson.dumps(update_data))
+    
+    return {"update_status": response.status_code}
+
+async def post_note(state: AgentState) -> AgentState:
+    """Add the planned note to the ticket"""
+    ticket_id = state.ticket.get("id")
+    action = state.action
+    
+    if action.get("action_type") not in ("resolve", "update", "escalate", "investigate") or not action.get("note"):
+        return {"note_status": None}
+    
+    # Skip the request when the note repeats the last one posted to this
+    # ticket, e.g. a stuck ticket being re-polled
+    if _LAST_NOTES.get(ticket_id) == _note_digest(action["note"]):
+        return {"note_status": None}
+    
+    note_url = f"{BASE_URL}/{ticket_id}/notes"
+    note_data = {
+        "body": action["note"],
+        # Investigation notes are internal
+        "private": action.get("action_type") == "investigate"
+    }
+    response = await asyncio.to_thread(SESSION.post, note_url, data=orjson.dumps(note_data))
+    if 200 <= response.status_code < 300:
+        _record_note(ticket_id, action["note"])
+    
+    return {"note_status": response.status_code}
+
+def finalize(state: AgentState) -> AgentState:
+    """Join the update and note branches into the final response"""
+    ticket = state.ticket
+    action = state.action
+    action_type = action.get("action_type")
+    
+    # The action succeeded if every request that was made succeeded
+    statuses = [code for code in (state.update_status, state.note_status) if code is not None]
     
     # Create a summary of what was done
     final_response = {
-        "ticket_id": ticket_id,
+        "ticket_id": ticket.get("id"),
         "action_taken": action_type,
         "details": action,
-        "success": True,  # Assuming success for simplicity
+        "success": all(200 <= code < 300 for code in statuses),
         "timestamp": ticket.get("updated_at")
     }
     
     # Update history
-    history = state.get("history", [])
     history_entry = {
         "timestamp": ticket.get("updated_at"),
         "action": action_type,
         "details": action
     }
-    history.append(history_entry)
     
-    # Update the state
-    return {**state, "final_response": final_response, "history": history}
+    # Update the state; only the changed keys are returned and the history reducer appends the entry
+    return {"final_response": final_response, "history": [history_entry]}
 
 # Create the graph
 def create_agent_graph():
@@ -303,41 +522,129 @@ def create_agent_graph():
     graph = StateGraph(AgentState)
     
     # Add the nodes
-    graph.add_node("analyzer", analyzer)
-    graph.add_node("action_planner", action_planner)
-    graph.add_node("execute_action", execute_action)
-    
-    # Add the edges
-    graph.add_edge("analyzer", "action_planner")
-    graph.add_edge("action_planner", "execute_action")
-    graph.add_edge("execute_action", END)
+    graph.add_node("fast_router", fast_router)
+    graph.add_node("analyze_and_plan", analyze_and_plan)
+    graph.add_node("update_ticket", update_ticket)
+    graph.add_node("post_note", post_note)
+    graph.add_node("finalize", finalize)
+    
+    # Add the edges; rule-matched and pre-planned tickets bypass the LLM, and the
+    # ticket update and the note fan out and run concurrently
+    graph.add_conditional_edges(
+        "fast_router",
+        _route_after_fast_router,
+        ["analyze_and_plan", "update_ticket", "post_note"]
+    )
+    graph.add_edge("analyze_and_plan", "update_ticket")
+    graph.add_edge("analyze_and_plan", "post_note")
+    graph.add_edge(["update_ticket", "post_note"], "finalize")
+    graph.add_edge("finalize", END)
     
     # Set the entry point
-    graph.set_entry_point("analyzer")
+    graph.set_entry_point("fast_router")
     
     # Compile the graph
     return graph.compile()
 
-def process_ticket(ticket_data: Dict[str, Any]) -> Dict[str, Any]:
-    """Process a single ticket through the agent graph"""
+# Compiled graph, built lazily on first use
+_GRAPH = None
+
+async def process_ticket_async(ticket_data: Dict[str, Any], plan: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Process a single ticket through the agent graph without blocking the event loop
+    
+    If a plan ({"analysis": ..., "action": ...}) is given, the planning step is skipped.
+    """
     # Create the initial state
-    initial_state = {
-        "ticket": ticket_data,
-        "analysis": {},
-        "action": {},
-        "history": [],
-        "final_response": {}
-    }
+    initial_state = AgentState(
+        ticket=ticket_data,
+        analysis=plan["analysis"] if plan else {},
+        action=plan["action"] if plan else {}
+    )
     
-    # Create the graph
-    graph = create_agent_graph()
+    # Compile the graph once and reuse it for every ticket
+    global _GRAPH
+    _GRAPH = _GRAPH or create_agent_graph()
     
     # Run the graph
-    result = graph.invoke(initial_state)
+    result = await _GRAPH.ainvoke(initial_state)
     
     # Return the final response
     return result["final_response"]
 
+def process_ticket(ticket_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Process a single ticket through the agent graph"""
+    return asyncio.run(process_ticket_async(ticket_data))
+
+async def process_tickets(tickets: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Process a batch of tickets concurrently, bounded by MAX_CONCURRENT_TICKETS"""
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_TICKETS)
+    
+    async def process_with_limit(ticket_data: Dict[str, Any]) -> Dict[str, Any]:
+        async with semaphore:
+            return await process_ticket_async(ticket_data)
+    
+    # Results are returned in the same order as the input tickets
+    return await asyncio.gather(*[process_with_limit(ticket) for ticket in tickets])
+
+async def batched_analyze_and_plan(tickets: List[Dict[str, Any]]) -> Dict[Any, Dict[str, Any]]:
+    """Analyze and plan several tickets in one LLM call, sharing the system prompt prefill
+    
+    Returns a mapping of ticket ID to {"analysis": ..., "action": ...}. Tickets the
+    model did not return a plan for are left out of the mapping.
+    """
+    plans = {}
+    
+    # Only send tickets that match no fast rule and whose content has not been
+    # planned before, so batched alerts get the same canned plans as single ones
+    uncached = []
+    for ticket in tickets:
+        plan = _match_fast_rule(ticket) or _get_cached_plan(_plan_cache_key(ticket))
+        if plan is not None:
+            plans[ticket.get("id")] = plan
+        else:
+            uncached.append(ticket)
+    
+    if not uncached:
+        return plans
+    
+    batch = [_ticket_payload(ticket) for ticket in uncached]
+    
+    prompt = _BATCH_PLAN_PROMPT.format_messages(tickets=orjson.dumps(batch).decode())
+    
+    # The output budget grows with the number of tickets in the batch
+    batch_llm = _JSON_LLM.bind(max_tokens=PLAN_MAX_TOKENS * len(batch))
+    try:
+        result = BatchPlanSchema.model_validate_json(await _astream_json(prompt, batch_llm))
+    except ValidationError:
+        # Leave the batch unplanned; the graph then plans each ticket on its own
+        return plans
+    
+    # Scatter the plans back by ticket ID
+    tickets_by_id = {ticket.get("id"): ticket for ticket in uncached}
+    for plan in result.plans:
+        analysis = plan.analysis.model_dump(exclude_none=True)
+        action = plan.action.model_dump(exclude_none=True)
+        plans[plan.id] = {"analysis": analysis, "action": action}
+        if plan.id in tickets_by_id:
+            _store_plan(_plan_cache_key(tickets_by_id[plan.id]), analysis, action)
+    
+    return plans
+
+async def process_tickets_batched(tickets: List[Dict[str, Any]], batch_size: int = PLAN_BATCH_SIZE) -> List[Dict[str, Any]]:
+    """Process a queue of tickets, planning batch_size tickets per LLM call"""
+    results = []
+    
+    for i in range(0, len(tickets), batch_size):
+        chunk = tickets[i:i + batch_size]
+        plans = await batched_analyze_and_plan(chunk)
+        
+        # Tickets the batch reply missed are planned individually by the graph
+        results.extend(await asyncio.gather(*[
+            process_ticket_async(ticket, plans.get(ticket.get("id"))) for ticket in chunk
+        ]))
+    
+    return results
+
 if __name__ == "__main__":
     # Example ticket for testing
     test_ticket = {
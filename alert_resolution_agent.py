@@ -1,12 +1,22 @@
 import os
 import re
-import json
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
 import smtplib
 import traceback
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from datetime import datetime, timedelta
+import logging
+import threading
+import atexit
+import hashlib
+from functools import lru_cache
+from types import MappingProxyType
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from email.message import EmailMessage
+from html import escape
+from datetime import datetime, timedelta, timezone
+from bisect import bisect_left, bisect_right
 from typing import Dict, List, Any, Optional, TypedDict
 from dotenv import load_dotenv
 from langchain_groq import ChatGroq
@@ -30,6 +40,8 @@ except Exception as e:
     print(f"Error loading environment variables: {str(e)}")
     # Continue execution even if env loading fails
 
+logger = logging.getLogger(__name__)
+
 # FreshService API configuration
 API_KEY = os.getenv("FRESHSERVICE_API_KEY", "")
 DOMAIN = os.getenv("FRESHSERVICE_DOMAIN", "example.freshservice.com")
@@ -42,6 +54,34 @@ if not API_KEY or not DOMAIN or DOMAIN == "example.freshservice.com":
 BASE_URL = f"https://{DOMAIN}/api/v2/tickets" if DOMAIN else ""
 auth = (API_KEY, "X") if API_KEY else None
 
+# Shared HTTP session so FreshService calls reuse keep-alive connections
+SESSION = requests.Session()
+SESSION.auth = auth
+# Ask for compressed JSON; ticket list pages are large and compress well
+SESSION.headers.update({"Accept-Encoding": "gzip", "Accept": "application/json"})
+
+# Connection pool sized for the concurrent ticket closes below, so worker
+# threads don't open and discard extra connections
+HTTP_POOL_SIZE = 16
+SESSION.mount("https://", HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE))
+atexit.register(SESSION.close)
+
+# Ticket list pagination; FreshService returns at most 100 tickets per page
+TICKETS_PER_PAGE = 100
+MAX_TICKET_PAGES = int(os.getenv("MAX_TICKET_PAGES", "50"))
+
+# Firing and resolved alerts created further apart than this are never paired
+MATCH_WINDOW = timedelta(hours=int(os.getenv("MATCH_WINDOW_HOURS", "24")))
+
+# Maximum number of tickets closed concurrently, to respect FreshService rate limits
+MAX_CONCURRENT_CLOSES = min(int(os.getenv("MAX_CONCURRENT_CLOSES", "8")), HTTP_POOL_SIZE)
+
+# When enabled, the LLM confirms each auto-close pair before it is closed
+CLASSIFY_PAIRS = os.getenv("CLASSIFY_PAIRS", "false").lower() == "true"
+
+# Pairs classified per LLM call; larger batches start to cost accuracy
+CLASSIFY_BATCH_SIZE = min(int(os.getenv("CLASSIFY_BATCH_SIZE", "6")), 6)
+
 # Email configuration
 EMAIL_HOST = os.getenv("EMAIL_HOST", "smtp.gmail.com")
 EMAIL_PORT = int(os.getenv("EMAIL_PORT", "587"))
@@ -49,6 +89,55 @@ EMAIL_USER = os.getenv("EMAIL_USER", "")
 EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD", "")
 EMAIL_TO = os.getenv("EMAIL_TO", "cloc@example.com")
 
+# Manual review email template
+_EMAIL_HEADER = """
+        <html>
+        <head>
+            <style>
+                table { border-collapse: collapse; width: 100%; }
+                th, td { border: 1px solid #ddd; padding: 8px; text-align: left; }
+                th { background-color: #f2f2f2; }
+                tr:nth-child(even) { background-color: #f9f9f9; }
+            </style>
+        </head>
+        <body>
+            <h2>Alert Resolution: Tickets Requiring Manual Review</h2>
+            <p>The following alert-resolution pairs were identified but have a time difference greater than 5 minutes:</p>
+            
+            <table>
+                <tr>
+                    <th>Firing Ticket</th>
+                    <th>Firing Subject</th>
+                    <th>Firing Created</th>
+                    <th>Resolved Ticket</th>
+                    <th>Resolved Subject</th>
+                    <th>Resolved Created</th>
+                    <th>Time Diff (min)</th>
+                </tr>
+        """
+
+_EMAIL_ROW = """
+                <tr>
+                    <td>{firing_id}</td>
+                    <td>{firing_subject}</td>
+                    <td>{firing_created}</td>
+                    <td>{resolved_id}</td>
+                    <td>{resolved_subject}</td>
+                    <td>{resolved_created}</td>
+                    <td>{time_diff_minutes:.1f}</td>
+                </tr>
+                """
+
+_EMAIL_FOOTER = """
+            </table>
+            
+            <p>Please review these tickets manually to determine if they should be closed.</p>
+            
+            <p>This is an automated message from the Cloud Ticket Resolution System.</p>
+        </body>
+        </html>
+        """
+
 # Status mapping
 STATUS_MAP = {
     2: "Open",
@@ -57,8 +146,47 @@ STATUS_MAP = {
     5: "Closed"
 }
 
-class AlertResolutionState(TypedDict):
+# Opposite status pairs; both words are treated as the same status when matching
+STATUS_PAIRS = (
+    ("offline", "online"),
+    ("down", "up"),
+    ("lost", "restored"),
+    ("unavailable", "available"),
+    ("unavailable", "back online"),  # Added for the specific test case
+    ("failure", "recovered"),
+    ("failed", "succeeded"),
+    ("high", "normal"),
+    ("critical", "normal"),
+    ("warning", "normal"),
+    ("problem", "resolved")
+)
+
+# Regexes used for matching, compiled once at import
+# Markers anywhere in a lowercased subject that identify firing and resolved alerts
+_FIRING_MARKER_RE = re.compile(r"\[firing|alert-critical|alert-warning|crit alert")
+_RESOLVED_MARKER_RE = re.compile(r"\[resolved\]|resolved:")
+
+# Firing/resolved and alert prefixes, stripped in this order in a single pass
+_PREFIX_RE = re.compile(
+    r"^(?:\[firing:\d+\]\s*)?(?:\[resolved\]\s*)?(?:resolved:\s*)?"
+    r"(?:alert-critical:\s*)?(?:alert-warning:\s*)?(?:crit alert:\s*)?"
+)
+_ALERT_WORDS_RE = re.compile(r"alert|warning|critical|error")
+# All status words in one alternation, longest first so phrases like
+# "back online" are replaced as a whole
+_STATUS_WORDS_RE = re.compile(r'\b(?:' + "|".join(sorted(
+    {word for pair in STATUS_PAIRS for word in pair}, key=len, reverse=True
+)) + r')\b')
+_WHITESPACE_RE = re.compile(r'\s+')
+_IDENTIFIER_RE = re.compile(r'\b([a-zA-Z0-9_-]+(?:[0-9._-]+[a-zA-Z0-9_-]*)?)\b')
+_IDENTIFIER_CHAR_RE = re.compile(r'[0-9_-]')
+_WORD_RE = re.compile(r'\b\w+\b')
+
+class AlertResolutionState(TypedDict, total=False):
     """State for the alert resolution agent"""
+    hours: int
+    run_ts: str
+    email_sent: bool
     tickets: List[Dict[str, Any]]
     firing_alerts: List[Dict[str, Any]]
     resolved_alerts: List[Dict[str, Any]]
@@ -67,6 +195,8 @@ class AlertResolutionState(TypedDict):
     manual_review_tickets: List[Dict[str, Any]]
     summary: Dict[str, Any]
 
+# Alert subjects repeat heavily, so cleaning and feature extraction are memoized
+@lru_cache(maxsize=2048)
 def clean_subject(subject: str) -> str:
     """Clean and normalize the subject for better matching"""
     if not subject:
@@ -75,47 +205,84 @@ def clean_subject(subject: str) -> str:
     # Convert to lowercase
     subject = subject.lower().strip()
     
-    # Remove firing/resolved prefixes for comparison
-    subject = re.sub(r"^\[firing:\d+\]\s*", "", subject)
-    subject = re.sub(r"^\[resolved\]\s*", "", subject)
-    subject = re.sub(r"^resolved:\s*", "", subject)
-    
-    # Remove alert prefixes
-    subject = re.sub(r"^alert-critical:\s*", "", subject)
-    subject = re.sub(r"^alert-warning:\s*", "", subject)
-    subject = re.sub(r"^crit alert:\s*", "", subject)
+    # Remove firing/resolved and alert prefixes for comparison
+    subject = _PREFIX_RE.sub("", subject, count=1)
     
     return subject.strip()
 
-def is_firing_alert(subject: str) -> bool:
-    """Check if the subject indicates a firing alert"""
+@lru_cache(maxsize=4096)
+def alert_type(subject: str) -> Optional[str]:
+    """Classify a subject as a "firing" or "resolved" alert, or None
+    
+    Firing markers take precedence, so a subject with both counts as firing.
+    """
     if not subject:
-        return False
+        return None
     
     subject_lower = subject.lower()
-    return (
-        "[firing" in subject_lower or 
-        "alert-critical" in subject_lower or 
-        "alert-warning" in subject_lower or
-        "crit alert" in subject_lower
-    )
+    if _FIRING_MARKER_RE.search(subject_lower):
+        return "firing"
+    if _RESOLVED_MARKER_RE.search(subject_lower):
+        return "resolved"
+    return None
+
+def is_firing_alert(subject: str) -> bool:
+    """Check if the subject indicates a firing alert"""
+    return bool(subject) and _FIRING_MARKER_RE.search(subject.lower()) is not None
 
 def is_resolved_alert(subject: str) -> bool:
     """Check if the subject indicates a resolved alert"""
-    if not subject:
-        return False
+    return bool(subject) and _RESOLVED_MARKER_RE.search(subject.lower()) is not None
+
+def strip_alert_words(subject: str) -> str:
+    """Remove any remaining alert indicators from a cleaned subject"""
+    return _ALERT_WORDS_RE.sub("", subject).strip()
+
+def normalize_status(subject: str) -> str:
+    """Replace status words with a placeholder so opposite statuses compare equal"""
+    return _STATUS_WORDS_RE.sub("STATUS", subject)
+
+def canonical_key(subject: str) -> str:
+    """Fully normalized form of a subject; subjects with equal keys always match
     
-    subject_lower = subject.lower()
-    return (
-        "[resolved]" in subject_lower or 
-        "resolved:" in subject_lower
-    )
+    Prefixes and alert words are removed, status words are replaced with a
+    placeholder and whitespace is collapsed.
+    """
+    subject = clean_subject(subject)
+    # Alerting tools sometimes stack prefixes, e.g. "[FIRING:1] [firing:3] ..."
+    stripped = _PREFIX_RE.sub("", subject, count=1).strip()
+    while stripped != subject:
+        subject, stripped = stripped, _PREFIX_RE.sub("", stripped, count=1).strip()
+    subject = normalize_status(strip_alert_words(subject))
+    return _WHITESPACE_RE.sub(" ", subject).strip()
 
-def subjects_match(firing_subject: str, resolved_subject: str) -> bool:
-    """Check if a firing alert subject matches a resolved alert subject
+def extract_identifiers(subject: str) -> List[str]:
+    """Extract key identifiers likely to be server/service names
     
-    This function compares the cleaned subjects of firing and resolved alerts
-    to determine if they refer to the same underlying issue.
+    These often follow patterns like server-01, app-server, R72_Pen_4, etc.
+    (typically containing numbers, underscores, or hyphens)
+    """
+    identifiers = _IDENTIFIER_RE.findall(subject)
+    return [identifier for identifier in identifiers if len(identifier) >= 4 and _IDENTIFIER_CHAR_RE.search(identifier)]
+
+def significant_words(subject: str) -> set:
+    """Words longer than three characters, used for the overlap check"""
+    return set(w for w in _WORD_RE.findall(subject) if len(w) > 3)
+
+@lru_cache(maxsize=4096)
+def subject_features(subject: str) -> Dict[str, Any]:
+    """Everything matching needs from a subject, computed once per distinct subject"""
+    cleaned = clean_subject(subject)
+    core = strip_alert_words(cleaned)
+    return {
+        "clean_subject": cleaned,
+        "canonical": canonical_key(subject),
+        "word_set": frozenset(significant_words(core)),
+        "ident_set": frozenset(extract_identifiers(core))
+    }
+
+def features_match(firing: Dict[str, Any], resolved: Dict[str, Any]) -> bool:
+    """Check if two sets of subject features refer to the same underlying issue
     
     Business Rules:
     1. Match tickets when they refer to the same underlying issue
@@ -123,107 +290,42 @@ def subjects_match(firing_subject: str, resolved_subject: str) -> bool:
     3. The core component/server/service name should match
     4. Handle variations in wording (offline/online, lost/restored, etc.)
     """
-    if not firing_subject or not resolved_subject:
-        return False
-        
-    # Simple exact match after cleaning
-    if firing_subject == resolved_subject:
+    # Same subject once prefixes, alert words and status words are normalized
+    if firing["canonical"] == resolved["canonical"]:
         return True
     
-    # Extract the core components from each subject
-    # First, remove any remaining alert indicators
-    firing_clean = re.sub(r"alert|warning|critical|error", "", firing_subject).strip()
-    resolved_clean = re.sub(r"alert|warning|critical|error", "", resolved_subject).strip()
-    
-    # Check if the core parts match
-    if firing_clean == resolved_clean:
+    # Matching identifiers that are likely to be server/service names
+    if firing["ident_set"] & resolved["ident_set"]:
         return True
     
-    # Handle common opposite status pairs
-    status_pairs = [
-        ("offline", "online"),
-        ("down", "up"),
-        ("lost", "restored"),
-        ("unavailable", "available"),
-        ("unavailable", "back online"),  # Added for the specific test case
-        ("failure", "recovered"),
-        ("failed", "succeeded"),
-        ("high", "normal"),
-        ("critical", "normal"),
-        ("warning", "normal"),
-        ("problem", "resolved")
-    ]
-    
-    # Replace status words with a placeholder to improve matching
-    normalized_firing = firing_clean
-    normalized_resolved = resolved_clean
-    
-    for status1, status2 in status_pairs:
-        normalized_firing = re.sub(r'\b' + status1 + r'\b', "STATUS", normalized_firing)
-        normalized_firing = re.sub(r'\b' + status2 + r'\b', "STATUS", normalized_firing)
-        normalized_resolved = re.sub(r'\b' + status1 + r'\b', "STATUS", normalized_resolved)
-        normalized_resolved = re.sub(r'\b' + status2 + r'\b', "STATUS", normalized_resolved)
-    
-    # Check if normalized versions match
-    if normalized_firing == normalized_resolved:
-        return True
-    
-    # Extract key identifiers (like server names, IPs, service names)
-    # These often follow patterns like server-01, app-server, R72_Pen_4, etc.
-    identifiers_firing = re.findall(r'\b([a-zA-Z0-9_-]+(?:[0-9._-]+[a-zA-Z0-9_-]*)?)\b', firing_clean)
-    identifiers_resolved = re.findall(r'\b([a-zA-Z0-9_-]+(?:[0-9._-]+[a-zA-Z0-9_-]*)?)\b', resolved_clean)
-    
-    # Look for matching identifiers that are likely to be server/service names
-    # (typically containing numbers, underscores, or hyphens)
-    for id_firing in identifiers_firing:
-        if len(id_firing) >= 4 and (re.search(r'[0-9_-]', id_firing)):
-            for id_resolved in identifiers_resolved:
-                if id_firing == id_resolved:
-                    return True
-    
-    # Special case for "service unavailable" and "service back online"
-    if "service" in firing_clean and "service" in resolved_clean:
-        if ("unavailable" in firing_clean and "back online" in resolved_clean) or \
-           ("back online" in firing_clean and "unavailable" in resolved_clean):
-            return True
-    
-    # Check for significant word overlap (at least 70% of words match)
-    words_firing = set(w for w in re.findall(r'\b\w+\b', firing_clean) if len(w) > 3)
-    words_resolved = set(w for w in re.findall(r'\b\w+\b', resolved_clean) if len(w) > 3)
-    
+    # Significant word overlap (at least 70% of words match)
+    words_firing = firing["word_set"]
+    words_resolved = resolved["word_set"]
     if words_firing and words_resolved:
-        common_words = words_firing.intersection(words_resolved)
-        overlap_percentage = len(common_words) / min(len(words_firing), len(words_resolved))
-        if overlap_percentage >= 0.7:
+        common_words = words_firing & words_resolved
+        if len(common_words) / min(len(words_firing), len(words_resolved)) >= 0.7:
             return True
     
-    # Check if one is a substring of the other (with at least 70% overlap)
-    if len(firing_clean) > len(resolved_clean):
-        longer, shorter = firing_clean, resolved_clean
-    else:
-        longer, shorter = resolved_clean, firing_clean
-        
-    if shorter in longer:
-        overlap_percentage = len(shorter) / len(longer)
-        if overlap_percentage >= 0.7:
-            return True
-    
-    # NEW: Check if the subject contains the same key entity with different status
-    # This is especially important for [FIRING:1] and [RESOLVED] ticket pairs
-    # Extract the main entity name (e.g., "disk usage warning on server-01")
-    entity_pattern = r'\b([a-zA-Z0-9_\s-]+(?:\s+on\s+[a-zA-Z0-9_-]+)?)\b'
-    firing_entities = re.findall(entity_pattern, firing_clean)
-    resolved_entities = re.findall(entity_pattern, resolved_clean)
-    
-    for f_entity in firing_entities:
-        if len(f_entity) > 5:  # Only consider substantial entities
-            for r_entity in resolved_entities:
-                if f_entity == r_entity or (f_entity in r_entity or r_entity in f_entity):
-                    return True
-    
     # If we get here, no match was found
     return False
 
+def subjects_match(firing_subject: str, resolved_subject: str) -> bool:
+    """Check if a firing alert subject matches a resolved alert subject"""
+    if not firing_subject or not resolved_subject:
+        return False
+    return features_match(subject_features(firing_subject), subject_features(resolved_subject))
+
+def blocking_keys(ticket: Dict[str, Any]) -> set:
+    """Index keys a firing and a resolved ticket must share to possibly match
+    
+    Every rule in features_match implies one shared key: the canonical
+    subject, an identifier or a significant word.
+    """
+    keys = {("canonical", ticket["canonical"])}
+    keys.update(("identifier", identifier) for identifier in ticket["ident_set"])
+    keys.update(("word", word) for word in ticket["word_set"])
+    return keys
+
 def parse_datetime(dt_str: str) -> datetime:
     """Parse datetime string from FreshService API"""
     try:
@@ -232,6 +334,20 @@ def parse_datetime(dt_str: str) -> datetime:
         # Fallback if the format is different
         return datetime.fromisoformat(dt_str.replace("Z", "+00:00"))
 
+def parse_created_at(created: Optional[str]) -> Optional[datetime]:
+    """Parse a ticket's created_at timestamp, or return None if it is missing or invalid"""
+    if not created:
+        return None
+    try:
+        created_dt = datetime.fromisoformat(created[:-1] + "+00:00" if created.endswith("Z") else created)
+    except (TypeError, ValueError):
+        return None
+    # FreshService timestamps are UTC; treat any without an offset the same way
+    # so all creation times are comparable
+    if created_dt.tzinfo is None:
+        created_dt = created_dt.replace(tzinfo=timezone.utc)
+    return created_dt
+
 def fetch_tickets(hours: int = 24) -> List[Dict[str, Any]]:
     """Fetch tickets from FreshService API"""
     # Check if API configuration is valid
@@ -243,23 +359,42 @@ def fetch_tickets(hours: int = 24) -> List[Dict[str, Any]]:
         return []
         
     try:
-        # Calculate time N hours ago
-        time_ago = datetime.now() - timedelta(hours=hours)
+        # Calculate time N hours ago, once, in UTC as the "Z" suffix says; the
+        # API filters on it server-side so no ticket is compared against it here
+        time_ago = datetime.now(timezone.utc) - timedelta(hours=hours)
         updated_since = time_ago.strftime("%Y-%m-%dT%H:%M:%SZ")
         
-        # Make API request
-        url = f"{BASE_URL}?updated_since={updated_since}&per_page=100"
-        print(f"Fetching tickets from: {url}")
-        
-        response = requests.get(url, auth=auth, timeout=30)  # Add timeout
-        
-        if response.status_code != 200:
-            print(f"Error fetching tickets: {response.status_code} - {response.text}")
-            return []
+        # Page through the results; a full page means there may be more
+        tickets = []
+        # Tickets updated while paging can shift onto a later page and be
+        # returned twice; keep the first copy of each ID
+        seen_ids = set()
+        for page in range(1, MAX_TICKET_PAGES + 1):
+            url = f"{BASE_URL}?updated_since={updated_since}&per_page={TICKETS_PER_PAGE}&page={page}"
+            print(f"Fetching tickets from: {url}")
+            
+            response = SESSION.get(url, timeout=30)  # Add timeout
+            
+            if response.status_code != 200:
+                print(f"Error fetching tickets: {response.status_code} - {response.text}")
+                # Keep the pages fetched so far
+                break
+            
+            # Parse response
+            data = orjson.loads(response.content)
+            page_tickets = data.get("tickets", [])
+            for ticket in page_tickets:
+                ticket_id = ticket.get("id")
+                if ticket_id in seen_ids:
+                    continue
+                seen_ids.add(ticket_id)
+                tickets.append(ticket)
+            
+            if len(page_tickets) < TICKETS_PER_PAGE:
+                break
+        else:
+            print(f"Stopped fetching after {MAX_TICKET_PAGES} pages")
         
-        # Parse response
-        data = response.json()
-        tickets = data.get("tickets", [])
         print(f"Fetched {len(tickets)} tickets from the last {hours} hours")
         return tickets
     except requests.exceptions.Timeout:
@@ -294,14 +429,14 @@ def close_ticket(ticket_id: int, note: str = None) -> bool:
             "status": 5  # 5 = Closed
         }
         
-        print(f"Sending payload to close ticket: {json.dumps(payload)}")
+        body = orjson.dumps(payload)
+        print(f"Sending payload to close ticket: {body.decode()}")
         
         # Make API request to update ticket status
-        response = requests.put(
+        response = SESSION.put(
             url, 
-            auth=auth, 
             headers={"Content-Type": "application/json"}, 
-            data=json.dumps(payload),
+            data=body,
             timeout=30
         )
         
@@ -319,11 +454,10 @@ def close_ticket(ticket_id: int, note: str = None) -> bool:
                     }
                     
                     print(f"Adding note to ticket #{ticket_id} via: {notes_url}")
-                    notes_response = requests.post(
+                    notes_response = SESSION.post(
                         notes_url,
-                        auth=auth,
                         headers={"Content-Type": "application/json"},
-                        data=json.dumps(notes_payload),
+                        data=orjson.dumps(notes_payload),
                         timeout=30
                     )
                     
@@ -353,6 +487,51 @@ def close_ticket(ticket_id: int, note: str = None) -> bool:
         traceback.print_exc()  # Print full traceback for debugging
         return False
 
+# SMTP connection kept open across notifications; guarded by a lock as
+# smtplib connections are not thread-safe
+_smtp_server = None
+_smtp_lock = threading.Lock()
+
+def _smtp_connection() -> smtplib.SMTP:
+    """Return the shared SMTP connection, connecting and logging in on first use"""
+    global _smtp_server
+    if _smtp_server is None:
+        # Connect with timeout
+        print(f"Connecting to SMTP server {EMAIL_HOST}:{EMAIL_PORT}")
+        if EMAIL_PORT == 465:
+            # Implicit TLS saves the STARTTLS round trip
+            server = smtplib.SMTP_SSL(EMAIL_HOST, EMAIL_PORT, timeout=30)
+        else:
+            server = smtplib.SMTP(EMAIL_HOST, EMAIL_PORT, timeout=30)
+        try:
+            if EMAIL_PORT != 465:
+                # Start TLS for security
+                print("Starting TLS connection")
+                server.starttls()
+            
+            # Login to server
+            print(f"Logging in as {EMAIL_USER}")
+            server.login(EMAIL_USER, EMAIL_PASSWORD)
+        except Exception:
+            server.close()
+            raise
+        _smtp_server = server
+    return _smtp_server
+
+def close_smtp_connection():
+    """Close the shared SMTP connection, if one is open"""
+    global _smtp_server
+    with _smtp_lock:
+        if _smtp_server is not None:
+            print("Closing SMTP connection")
+            try:
+                _smtp_server.quit()
+            except Exception:
+                _smtp_server.close()
+            _smtp_server = None
+
+atexit.register(close_smtp_connection)
+
 def send_email_notification(subject: str, body: str) -> bool:
     """Send email notification for manual review"""
     if not EMAIL_USER or not EMAIL_PASSWORD:
@@ -363,49 +542,102 @@ def send_email_notification(subject: str, body: str) -> bool:
         print("Email recipient not configured. Skipping email notification.")
         return False
     
+    global _smtp_server
     try:
         print(f"Preparing to send email notification to {EMAIL_TO}")
         
         # Create message
-        msg = MIMEMultipart()
+        msg = EmailMessage()
         msg["From"] = EMAIL_USER
         msg["To"] = EMAIL_TO
         msg["Subject"] = subject
+        msg.set_content(body, subtype="html")
         
-        # Attach body
-        msg.attach(MIMEText(body, "html"))
-        
-        # Send email with timeout
-        print(f"Connecting to SMTP server {EMAIL_HOST}:{EMAIL_PORT}")
-        server = smtplib.SMTP(EMAIL_HOST, EMAIL_PORT, timeout=30)
+        with _smtp_lock:
+            try:
+                # Send email on the shared connection
+                print("Sending email message")
+                _smtp_connection().send_message(msg)
+            except smtplib.SMTPServerDisconnected:
+                # The server dropped the idle connection; reconnect once
+                print("SMTP connection was closed by the server, reconnecting")
+                _smtp_server = None
+                _smtp_connection().send_message(msg)
+            except Exception as e:
+                print(f"Error during SMTP operation: {str(e)}")
+                return False
         
-        try:
-            # Start TLS for security
-            print("Starting TLS connection")
-            server.starttls()
-            
-            # Login to server
-            print(f"Logging in as {EMAIL_USER}")
-            server.login(EMAIL_USER, EMAIL_PASSWORD)
-            
-            # Send email
-            print("Sending email message")
-            server.send_message(msg)
-            
-            print(f"✓ Email notification successfully sent to {EMAIL_TO}")
-            return True
-        except Exception as e:
-            print(f"Error during SMTP operation: {str(e)}")
-            return False
-        finally:
-            # Always quit the server connection
-            print("Closing SMTP connection")
-            server.quit()
+        print(f"✓ Email notification successfully sent to {EMAIL_TO}")
+        return True
     except Exception as e:
         print(f"Failed to send email notification: {str(e)}")
         traceback.print_exc()  # Print full traceback for debugging
         return False
 
+CLASSIFY_SYSTEM_PROMPT = """You review pairs of monitoring alert tickets. Each line of the user message is a numbered pair of a FIRING alert subject and a RESOLVED alert subject.
+    
+    For each pair decide whether the resolved alert is the recovery of the same issue on the same server or service as the firing alert.
+    
+    Respond ONLY with a JSON object of the form:
+    {"results": [{"index": <pair number>, "same_issue": <true or false>, "reason": "<one short sentence>"}]}
+    with one entry per pair.
+    """
+
+_CLASSIFY_PROMPT = ChatPromptTemplate.from_messages([
+    SystemMessage(content=CLASSIFY_SYSTEM_PROMPT),
+    ("human", "{batch}")
+])
+
+@lru_cache(maxsize=1)
+def _classifier_llm():
+    """JSON-mode LLM for pair classification, created on first use"""
+    llm = ChatGroq(model=os.getenv("LLM_MODEL", "llama3-70b-8192"), temperature=0)
+    return llm.bind(response_format={"type": "json_object"})
+
+def _classify_chunk(chunk: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+    """Classify a chunk of pairs in one LLM call, keyed by position in the chunk"""
+    formatted = "\n".join(
+        f"{i}. FIRING: {pair.get('firing_subject', '')} / RESOLVED: {pair.get('resolved_subject', '')}"
+        for i, pair in enumerate(chunk)
+    )
+    response = _classifier_llm().invoke(_CLASSIFY_PROMPT.format_messages(batch=formatted))
+    results = {}
+    for entry in orjson.loads(response.content).get("results", []):
+        index = entry.get("index")
+        if isinstance(index, int) and 0 <= index < len(chunk):
+            results[index] = {"same_issue": bool(entry.get("same_issue")), "reason": entry.get("reason", "")}
+    return results
+
+def classify_pairs_batched(pairs: List[Dict[str, Any]], batch_size: int = CLASSIFY_BATCH_SIZE) -> List[Optional[Dict[str, Any]]]:
+    """Ask the LLM whether each matched pair is really the same issue
+    
+    Pairs share one system prompt and are sent batch_size at a time. Returns one
+    {"same_issue": bool, "reason": str} per pair, in order, or None where the
+    pair could not be classified.
+    """
+    batch_size = max(1, min(batch_size, 6))
+    classifications = []
+    for i in range(0, len(pairs), batch_size):
+        chunk = pairs[i:i + batch_size]
+        try:
+            results = _classify_chunk(chunk)
+        except Exception as e:
+            print(f"Error classifying pair batch: {str(e)}")
+            results = {}
+        
+        # Pairs the batch reply missed are classified individually
+        for index, pair in enumerate(chunk):
+            if index not in results and len(chunk) > 1:
+                try:
+                    single = _classify_chunk([pair])
+                    if 0 in single:
+                        results[index] = single[0]
+                except Exception as e:
+                    print(f"Error classifying pair {pair.get('firing_id')}/{pair.get('resolved_id')}: {str(e)}")
+            classifications.append(results.get(index))
+    
+    return classifications
+
 # Agent nodes
 def fetch_recent_tickets(state: Dict[str, Any]) -> Dict[str, Any]:
     """Fetch recent tickets from FreshService API"""
@@ -429,6 +661,17 @@ def fetch_recent_tickets(state: Dict[str, Any]) -> Dict[str, Any]:
         state["tickets"] = []
         return state
 
+# Categorized alert lists of recent runs, keyed by a digest of the ticket set
+_CATEGORIZE_CACHE_SIZE = 8
+_categorize_cache = OrderedDict()
+
+def _ticket_set_key(tickets: List[Dict[str, Any]]) -> bytes:
+    """Digest of each ticket's ID, update time and the fields categorization reads"""
+    digest = hashlib.blake2b(digest_size=16)
+    for ticket in tickets:
+        digest.update(f"{ticket.get('id')}\0{ticket.get('updated_at')}\0{ticket.get('created_at')}\0{ticket.get('subject')}\n".encode())
+    return digest.digest()
+
 def categorize_tickets(state: Dict[str, Any]) -> Dict[str, Any]:
     """Categorize tickets into firing and resolved alerts"""
     try:
@@ -437,25 +680,44 @@ def categorize_tickets(state: Dict[str, Any]) -> Dict[str, Any]:
         if not tickets:
             print("No tickets found to categorize")
         
+        # Runs over an unchanged ticket set reuse the previous categorization
+        cache_key = _ticket_set_key(tickets)
+        cached = _categorize_cache.get(cache_key)
+        if cached is not None:
+            _categorize_cache.move_to_end(cache_key)
+            state["firing_alerts"], state["resolved_alerts"] = list(cached[0]), list(cached[1])
+            print(f"Reused categorization of {len(cached[0])} firing alerts and {len(cached[1])} resolved alerts")
+            return state
+        
         firing_alerts = []
         resolved_alerts = []
         
-        for ticket in tickets:
-            subject = ticket.get("subject", "").strip()
-            if not subject:
+        # Categorize based on subject; classification is memoized per subject,
+        # so mapping it over all tickets is mostly cache hits
+        subjects = [ticket.get("subject", "").strip() for ticket in tickets]
+        for ticket, subject, kind in zip(tickets, subjects, map(alert_type, subjects)):
+            # Tickets that are not alerts are never matched, so they are left as fetched
+            if kind is None:
                 continue
             
-            # Add clean subject for matching
-            ticket["clean_subject"] = clean_subject(subject)
+            # Add clean subject, canonical key and the identifier/word sets used
+            # for matching, so they are computed once per ticket
+            ticket.update(subject_features(subject))
+            
+            # Parse the creation time once instead of once per compared pair
+            ticket["created_dt"] = parse_created_at(ticket.get("created_at"))
             
-            # Categorize based on subject
-            if is_firing_alert(subject):
+            if kind == "firing":
                 firing_alerts.append(ticket)
-            elif is_resolved_alert(subject):
+            elif kind == "resolved":
                 resolved_alerts.append(ticket)
         
         print(f"Categorized {len(firing_alerts)} firing alerts and {len(resolved_alerts)} resolved alerts")
         
+        _categorize_cache[cache_key] = (tuple(firing_alerts), tuple(resolved_alerts))
+        while len(_categorize_cache) > _CATEGORIZE_CACHE_SIZE:
+            _categorize_cache.popitem(last=False)
+        
         # Create a new state dictionary and update it
         state["firing_alerts"] = firing_alerts
         state["resolved_alerts"] = resolved_alerts
@@ -475,7 +737,8 @@ def match_alert_pairs(state: Dict[str, Any]) -> Dict[str, Any]:
     Business Rules:
     1. Match tickets based on subject similarity
     2. Auto-close pairs with time gap <= 5 minutes
-    3. Send for manual review if time gap > 5 minutes
+    3. Send for manual review if time gap > 5 minutes (up to MATCH_WINDOW)
+    4. With CLASSIFY_PAIRS, send auto-close pairs the LLM rejects for manual review
     """
     try:
         firing_alerts = state.get("firing_alerts", [])
@@ -485,14 +748,36 @@ def match_alert_pairs(state: Dict[str, Any]) -> Dict[str, Any]:
         
         print(f"Attempting to match {len(firing_alerts)} firing alerts with {len(resolved_alerts)} resolved alerts")
         
-        # Debug: Print sample of firing and resolved alerts
-        print("\nDEBUG: Sample of Firing Alerts:")
-        for i, alert in enumerate(firing_alerts[:3]):
-            print(f"  {i+1}. ID: {alert.get('id')}, Subject: {alert.get('subject')}, Clean: {alert.get('clean_subject', '')}, Created: {alert.get('created_at')}")
+        # Per-alert and per-pair details are only formatted when debug logging is on
+        debug_enabled = logger.isEnabledFor(logging.DEBUG)
+        if debug_enabled:
+            for label, alerts in (("Firing", firing_alerts), ("Resolved", resolved_alerts)):
+                for i, alert in enumerate(alerts[:3]):
+                    logger.debug("Sample %s alert %d. ID: %s, Subject: %s, Clean: %s, Created: %s",
+                                 label, i + 1, alert.get("id"), alert.get("subject"),
+                                 alert.get("clean_subject", ""), alert.get("created_at"))
+        
+        # Index resolved alerts by blocking key so each firing alert is only
+        # compared with the resolved alerts it could possibly match. The fields
+        # the inner loop needs are unpacked once into a tuple per alert.
+        resolved_by_key = {}
+        resolved_tuples = []
+        for resolved in resolved_alerts:
+            if not resolved.get("clean_subject") or not resolved.get("id") or not resolved.get("created_dt"):
+                continue
+            position = len(resolved_tuples)
+            resolved_tuples.append((resolved["id"], resolved["created_at"], resolved["created_dt"],
+                                    resolved.get("subject", ""), resolved))
+            for key in blocking_keys(resolved):
+                resolved_by_key.setdefault(key, []).append((resolved["created_dt"], position))
         
-        print("\nDEBUG: Sample of Resolved Alerts:")
-        for i, alert in enumerate(resolved_alerts[:3]):
-            print(f"  {i+1}. ID: {alert.get('id')}, Subject: {alert.get('subject')}, Clean: {alert.get('clean_subject', '')}, Created: {alert.get('created_at')}")
+        # Sort each key's alerts by creation time, so a firing alert's time
+        # window is bisected out of every key it shares instead of scanning
+        # all resolved alerts in the window
+        resolved_index = {}
+        for key, entries in resolved_by_key.items():
+            entries.sort(key=lambda entry: entry[0])
+            resolved_index[key] = ([created_dt for created_dt, _ in entries], [position for _, position in entries])
         
         for firing in firing_alerts:
             firing_subject = firing.get("clean_subject", "")
@@ -503,70 +788,84 @@ def match_alert_pairs(state: Dict[str, Any]) -> Dict[str, Any]:
                 print(f"Skipping firing alert with missing data: {firing.get('id', 'unknown')}")
                 continue
             
-            try:
-                firing_time = datetime.fromisoformat(firing_created.replace("Z", "+00:00"))
-            except Exception as e:
-                print(f"Error parsing firing time for ticket #{firing_id}: {str(e)}")
+            firing_time = firing.get("created_dt")
+            if firing_time is None:
+                print(f"Error parsing firing time for ticket #{firing_id}: {firing_created!r}")
                 continue
+            firing_raw_subject = firing.get("subject", "")
             
-            for resolved in resolved_alerts:
-                resolved_subject = resolved.get("clean_subject", "")
-                resolved_id = resolved.get("id")
-                resolved_created = resolved.get("created_at")
-                
-                if not resolved_subject or not resolved_id or not resolved_created:
+            # Candidates share a blocking key and were created within the time window
+            window_start = firing_time - MATCH_WINDOW
+            window_end = firing_time + MATCH_WINDOW
+            candidates = set()
+            for key in blocking_keys(firing):
+                entry = resolved_index.get(key)
+                if entry is None:
                     continue
+                times, positions = entry
+                candidates.update(positions[bisect_left(times, window_start):bisect_right(times, window_end)])
+            
+            # Candidates in their original order, so pairs come out as before
+            for position in sorted(candidates):
+                resolved_id, resolved_created, resolved_time, resolved_raw_subject, resolved = resolved_tuples[position]
                 
                 # Check if subjects match
-                match_result = subjects_match(firing_subject, resolved_subject)
-                if not match_result:
-                    # Debug: Print subject comparison for first few non-matches
-                    if firing_id % 10 == 0 and resolved_id % 10 == 0:  # Only print some samples to avoid log flooding
-                        print(f"\nDEBUG: No match between:\n  Firing #{firing_id}: '{firing_subject}' (from '{firing.get('subject', '')}')\n  Resolved #{resolved_id}: '{resolved_subject}' (from '{resolved.get('subject', '')}')")
+                if not features_match(firing, resolved):
                     continue
                 
-                # Calculate time difference
-                try:
-                    resolved_time = datetime.fromisoformat(resolved_created.replace("Z", "+00:00"))
-                    
-                    # Calculate absolute time difference regardless of which came first
-                    time_diff = resolved_time - firing_time
-                    time_diff_minutes = time_diff.total_seconds() / 60
-                    abs_time_diff_minutes = abs(time_diff_minutes)
-                    
-                    # Print match found
-                    print(f"\nMATCH FOUND: Firing #{firing_id} with Resolved #{resolved_id}")
-                    print(f"  Firing: '{firing.get('subject', '')}'")
-                    print(f"  Resolved: '{resolved.get('subject', '')}'")  
-                    print(f"  Time diff: {time_diff_minutes:.2f} minutes (absolute: {abs_time_diff_minutes:.2f})")
-                    
-                    # Create a deep copy of the ticket objects to avoid reference issues
-                    firing_copy = firing.copy()
-                    resolved_copy = resolved.copy()
-                    
-                    # Create pair object with complete ticket information
-                    pair = {
-                        "firing": firing_copy,
-                        "resolved": resolved_copy,
-                        "time_diff_minutes": time_diff_minutes,
-                        "abs_time_diff_minutes": abs_time_diff_minutes,
-                        "firing_id": firing_id,
-                        "resolved_id": resolved_id,
-                        "firing_subject": firing.get("subject", ""),
-                        "resolved_subject": resolved.get("subject", "")
-                    }
-                    
-                    # Check if absolute time difference is within auto-close threshold (5 minutes)
-                    # This handles cases where the timestamps might be in a different order
-                    if abs_time_diff_minutes <= 5:
-                        print(f"  Result: Auto-close pair (within 5 minute threshold)")
-                        matched_pairs.append(pair)
-                    else:
-                        print(f"  Result: Manual review pair (exceeds 5 minute threshold)")
-                        manual_review_tickets.append(pair)
-                except Exception as e:
-                    print(f"Error calculating time difference: {str(e)}")
+                # Calculate time difference regardless of which came first. Both
+                # times are timezone-aware (see parse_created_at), so this cannot fail
+                time_diff = resolved_time - firing_time
+                time_diff_minutes = time_diff.total_seconds() / 60
+                abs_time_diff_minutes = abs(time_diff_minutes)
+                
+                # Log match found
+                if debug_enabled:
+                    logger.debug("Firing: '%s' / Resolved: '%s'", firing_raw_subject, resolved_raw_subject)
+                
+                # Create pair object referencing the ticket objects; nothing
+                # downstream mutates them, so they are not copied per pair
+                pair = {
+                    "firing": firing,
+                    "resolved": resolved,
+                    "time_diff_minutes": time_diff_minutes,
+                    "abs_time_diff_minutes": abs_time_diff_minutes,
+                    "firing_id": firing_id,
+                    "resolved_id": resolved_id,
+                    "firing_subject": firing_raw_subject,
+                    "resolved_subject": resolved_raw_subject,
+                    "firing_created": firing_created,
+                    "resolved_created": resolved_created
+                }
+                
+                # Check if absolute time difference is within auto-close threshold (5 minutes)
+                # This handles cases where the timestamps might be in a different order
+                auto_close = abs_time_diff_minutes <= 5
+                logger.info("Match found: firing #%s with resolved #%s, time diff %.2f minutes -> %s",
+                            firing_id, resolved_id, time_diff_minutes,
+                            "auto-close" if auto_close else "manual review")
+                if auto_close:
+                    matched_pairs.append(pair)
+                else:
+                    manual_review_tickets.append(pair)
+        
+        # With CLASSIFY_PAIRS, a pair the LLM judges to be a different issue is
+        # sent for manual review instead of being auto-closed; pairs it could
+        # not classify are closed on the subject match alone
+        if CLASSIFY_PAIRS and matched_pairs:
+            confirmed_pairs = []
+            for pair, classification in zip(matched_pairs, classify_pairs_batched(matched_pairs)):
+                if classification is None:
+                    confirmed_pairs.append(pair)
                     continue
+                pair["classification"] = classification
+                if classification["same_issue"]:
+                    confirmed_pairs.append(pair)
+                else:
+                    logger.info("LLM rejected pair: firing #%s with resolved #%s -> manual review (%s)",
+                                pair["firing_id"], pair["resolved_id"], classification["reason"])
+                    manual_review_tickets.append(pair)
+            matched_pairs = confirmed_pairs
         
         print(f"Found {len(matched_pairs)} pairs for auto-close and {len(manual_review_tickets)} pairs for manual review")
         
@@ -583,6 +882,24 @@ def match_alert_pairs(state: Dict[str, Any]) -> Dict[str, Any]:
         state["manual_review_tickets"] = []
         return state
 
+def _pair_closures(pair: Dict[str, Any]) -> Optional[List[tuple]]:
+    """The (ticket_id, note) closures for both tickets of a matched alert pair"""
+    firing_id = pair.get("firing_id")
+    resolved_id = pair.get("resolved_id")
+    time_diff = pair.get("time_diff_minutes", 0)
+    
+    if not firing_id or not resolved_id:
+        print(f"Missing ticket IDs in pair: {pair}")
+        return None
+    
+    print(f"Processing pair: Firing #{firing_id} and Resolved #{resolved_id} with time diff {time_diff:.2f} minutes")
+    
+    # Create closure notes
+    firing_note = f"Auto-closed by Cloud Ticket Resolution System. Matched with ticket #{resolved_id} as an alert-resolution pair that resolved within 5 minutes."
+    resolved_note = f"Auto-closed by Cloud Ticket Resolution System. Matched with ticket #{firing_id} as an alert-resolution pair that resolved within 5 minutes."
+    
+    return [(firing_id, firing_note), (resolved_id, resolved_note)]
+
 def process_matched_pairs(state: Dict[str, Any]) -> Dict[str, Any]:
     """Process matched alert pairs for auto-closing"""
     try:
@@ -592,37 +909,37 @@ def process_matched_pairs(state: Dict[str, Any]) -> Dict[str, Any]:
         
         print(f"Processing {len(matched_pairs)} matched pairs for auto-closing")
         
-        for pair in matched_pairs:
-            try:
-                firing_id = pair.get("firing_id")
-                resolved_id = pair.get("resolved_id")
-                time_diff = pair.get("time_diff_minutes", 0)
+        if matched_pairs:
+            # Every ticket is closed as its own task, so both tickets of a pair and
+            # all pairs overlap on the network while waiting on FreshService
+            with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_CLOSES, 2 * len(matched_pairs))) as executor:
+                pending = []
+                # A ticket can match several alerts; it is closed (and noted) once
+                # and every pair it belongs to shares that result
+                closing = {}
+                for pair in matched_pairs:
+                    try:
+                        closures = _pair_closures(pair)
+                        if closures is None:
+                            continue
+                        futures = []
+                        for ticket_id, note in closures:
+                            if ticket_id not in closing:
+                                closing[ticket_id] = executor.submit(close_ticket, ticket_id, note)
+                            futures.append(closing[ticket_id])
+                        pending.append((pair, futures))
+                    except Exception as e:
+                        print(f"Error processing pair: {str(e)}")
                 
-                if not firing_id or not resolved_id:
-                    print(f"Missing ticket IDs in pair: {pair}")
-                    continue
-                
-                print(f"Processing pair: Firing #{firing_id} and Resolved #{resolved_id} with time diff {time_diff:.2f} minutes")
-                
-                # Create closure notes
-                firing_note = f"Auto-closed by Cloud Ticket Resolution System. Matched with ticket #{resolved_id} as an alert-resolution pair that resolved within 5 minutes."
-                resolved_note = f"Auto-closed by Cloud Ticket Resolution System. Matched with ticket #{firing_id} as an alert-resolution pair that resolved within 5 minutes."
-                
-                # Close firing alert
-                print(f"Attempting to close firing alert ticket #{firing_id}...")
-                firing_closed = close_ticket(firing_id, firing_note)
-                
-                # Close resolved alert
-                print(f"Attempting to close resolved alert ticket #{resolved_id}...")
-                resolved_closed = close_ticket(resolved_id, resolved_note)
-                
-                if firing_closed and resolved_closed:
-                    print(f"✓ Successfully closed alert pair: #{firing_id} and #{resolved_id}")
-                    closed_tickets.append(pair)
-                else:
-                    print(f"✗ Failed to close one or both tickets in pair: #{firing_id} and #{resolved_id}")
-            except Exception as e:
-                print(f"Error processing pair: {str(e)}")
+                for pair, futures in pending:
+                    try:
+                        if all([future.result() for future in futures]):
+                            print(f"✓ Successfully closed alert pair: #{pair['firing_id']} and #{pair['resolved_id']}")
+                            closed_tickets.append(pair)
+                        else:
+                            print(f"✗ Failed to close one or both tickets in pair: #{pair['firing_id']} and #{pair['resolved_id']}")
+                    except Exception as e:
+                        print(f"Error processing pair: {str(e)}")
         
         print(f"Successfully closed {len(closed_tickets)} alert pairs out of {len(matched_pairs)} matched pairs")
         
@@ -637,84 +954,54 @@ def process_matched_pairs(state: Dict[str, Any]) -> Dict[str, Any]:
         state["closed_tickets"] = []
         return state
 
+def _pair_created(pair: Dict[str, Any], side: str) -> datetime:
+    """Creation time of one side of a pair, reusing the time parsed during categorization"""
+    created_dt = pair.get(side, {}).get("created_dt")
+    return created_dt or parse_datetime(pair.get(f"{side}_created", ""))
+
 def handle_manual_review(state: Dict[str, Any]) -> Dict[str, Any]:
     """Handle tickets that need manual review"""
     try:
         # Access manual review tickets using the property or fallback to direct access
         manual_review_tickets = state.get("manual_review_tickets", [])
         
-        print(f"Handling {len(manual_review_tickets)} tickets that need manual review")
+        logger.info("Handling %d tickets that need manual review", len(manual_review_tickets))
         
         if not manual_review_tickets:
-            print("No tickets require manual review")
+            logger.info("No tickets require manual review")
             return state
         
         # Create email content
         subject = f"Alert Resolution: {len(manual_review_tickets)} Ticket Pairs Need Manual Review"
         
-        body = f"""
-        <html>
-        <head>
-            <style>
-                table {{ border-collapse: collapse; width: 100%; }}
-                th, td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
-                th {{ background-color: #f2f2f2; }}
-                tr:nth-child(even) {{ background-color: #f9f9f9; }}
-            </style>
-        </head>
-        <body>
-            <h2>Alert Resolution: Tickets Requiring Manual Review</h2>
-            <p>The following alert-resolution pairs were identified but have a time difference greater than 5 minutes:</p>
-            
-            <table>
-                <tr>
-                    <th>Firing Ticket</th>
-                    <th>Firing Subject</th>
-                    <th>Firing Created</th>
-                    <th>Resolved Ticket</th>
-                    <th>Resolved Subject</th>
-                    <th>Resolved Created</th>
-                    <th>Time Diff (min)</th>
-                </tr>
-        """
-        
+        # Build one row per pair from the precompiled row template and join once,
+        # instead of growing the body string. Subjects come from alert senders,
+        # so they are HTML-escaped.
+        rows = []
         for pair in manual_review_tickets:
             try:
-                firing_created = datetime.fromisoformat(pair.get("firing_created", "").replace("Z", "+00:00")).strftime("%Y-%m-%d %H:%M:%S")
-                resolved_created = datetime.fromisoformat(pair.get("resolved_created", "").replace("Z", "+00:00")).strftime("%Y-%m-%d %H:%M:%S")
-                
-                body += f"""
-                <tr>
-                    <td>{pair.get("firing_id", "N/A")}</td>
-                    <td>{pair.get("firing_subject", "N/A")}</td>
-                    <td>{firing_created}</td>
-                    <td>{pair.get("resolved_id", "N/A")}</td>
-                    <td>{pair.get("resolved_subject", "N/A")}</td>
-                    <td>{resolved_created}</td>
-                    <td>{pair.get("time_diff_minutes", 0):.1f}</td>
-                </tr>
-                """
+                rows.append(_EMAIL_ROW.format(
+                    firing_id=pair.get("firing_id", "N/A"),
+                    firing_subject=escape(pair.get("firing_subject", "N/A")),
+                    firing_created=_pair_created(pair, "firing").strftime("%Y-%m-%d %H:%M:%S"),
+                    resolved_id=pair.get("resolved_id", "N/A"),
+                    resolved_subject=escape(pair.get("resolved_subject", "N/A")),
+                    resolved_created=_pair_created(pair, "resolved").strftime("%Y-%m-%d %H:%M:%S"),
+                    time_diff_minutes=pair.get("time_diff_minutes", 0)
+                ))
             except Exception as e:
-                print(f"Error formatting ticket pair for email: {str(e)}")
+                logger.error("Error formatting ticket pair for email: %s", e)
         
-        body += """
-            </table>
-            
-            <p>Please review these tickets manually to determine if they should be closed.</p>
-            
-            <p>This is an automated message from the Cloud Ticket Resolution System.</p>
-        </body>
-        </html>
-        """
+        body = _EMAIL_HEADER + "".join(rows) + _EMAIL_FOOTER
         
-        print("Sending email notification for manual review tickets")
+        logger.info("Sending email notification for manual review tickets")
         # Send email notification
         email_sent = send_email_notification(subject, body)
         
         if email_sent:
-            print("✓ Email notification sent successfully")
+            logger.info("✓ Email notification sent successfully")
         else:
-            print("✗ Failed to send email notification")
+            logger.warning("✗ Failed to send email notification")
         
         # Create a new state dictionary and update it
         state["email_sent"] = email_sent
@@ -722,34 +1009,47 @@ def handle_manual_review(state: Dict[str, Any]) -> Dict[str, Any]:
         # Return the updated state
         return state
     except Exception as e:
-        print(f"Error in handle_manual_review: {str(e)}")
+        logger.error("Error in handle_manual_review: %s", e)
         # Return state with email_sent set to False
         state["email_sent"] = False
         return state
 
+# Summary of a run with no tickets; read-only so it can be shared
+_EMPTY_SUMMARY = MappingProxyType({
+    "total_tickets": 0,
+    "firing_alerts": 0,
+    "resolved_alerts": 0,
+    "matched_pairs": 0,
+    "closed_tickets": 0,
+    "manual_review_tickets": 0,
+    "email_sent": False
+})
+
 def generate_summary(state: Dict[str, Any]) -> Dict[str, Any]:
     """Generate a summary of the alert resolution process"""
     try:
-        # Safely access state values with defaults
-        tickets = state.get("tickets", [])
-        firing_alerts = state.get("firing_alerts", [])
-        resolved_alerts = state.get("resolved_alerts", [])
-        matched_pairs = state.get("matched_pairs", [])
-        closed_tickets = state.get("closed_tickets", [])
-        manual_review_tickets = state.get("manual_review_tickets", [])
+        # With no tickets every count is zero; the quiet-hour case skips the
+        # counting and the JSON formatting
+        if not state.get("tickets"):
+            state["summary"] = dict(_EMPTY_SUMMARY, timestamp=state.get("run_ts") or datetime.now(timezone.utc).isoformat(timespec="seconds"))
+            logger.info("Alert Resolution Summary: no tickets")
+            return state
         
+        # Count each list in the state; a missing key counts as empty without
+        # building a default list
         summary = {
-            "total_tickets": len(tickets),
-            "firing_alerts": len(firing_alerts),
-            "resolved_alerts": len(resolved_alerts),
-            "matched_pairs": len(matched_pairs),
-            "closed_tickets": len(closed_tickets),
-            "manual_review_tickets": len(manual_review_tickets),
+            "total_tickets": len(state.get("tickets", ())),
+            "firing_alerts": len(state.get("firing_alerts", ())),
+            "resolved_alerts": len(state.get("resolved_alerts", ())),
+            "matched_pairs": len(state.get("matched_pairs", ())),
+            "closed_tickets": len(state.get("closed_tickets", ())),
+            "manual_review_tickets": len(state.get("manual_review_tickets", ())),
             "email_sent": state.get("email_sent", False),
-            "timestamp": datetime.now().isoformat()
+            "timestamp": state.get("run_ts") or datetime.now(timezone.utc).isoformat(timespec="seconds")
         }
         
-        print(f"Alert Resolution Summary: {json.dumps(summary, indent=2)}")
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Alert Resolution Summary: %s", orjson.dumps(summary, option=orjson.OPT_INDENT_2).decode())
         
         # Create a new state dictionary and update it
         state["summary"] = summary
@@ -757,19 +1057,9 @@ def generate_summary(state: Dict[str, Any]) -> Dict[str, Any]:
         # Return the updated state
         return state
     except Exception as e:
-        print(f"Error in generate_summary: {str(e)}")
+        logger.error("Error in generate_summary: %s", e)
         # Return minimal valid summary
-        state["summary"] = {
-            "total_tickets": 0,
-            "firing_alerts": 0,
-            "resolved_alerts": 0,
-            "matched_pairs": 0,
-            "closed_tickets": 0,
-            "manual_review_tickets": 0,
-            "email_sent": False,
-            "error": str(e),
-            "timestamp": datetime.now().isoformat()
-        }
+        state["summary"] = dict(_EMPTY_SUMMARY, error=str(e), timestamp=state.get("run_ts") or datetime.now(timezone.utc).isoformat(timespec="seconds"))
         return state
 
 def create_alert_resolution_graph() -> StateGraph:
@@ -795,7 +1085,7 @@ def create_alert_resolution_graph() -> StateGraph:
     
     # Set entry point
     graph.set_entry_point("fetch_recent_tickets")
-    print("inside alert resolution graph before compiling")
+    logger.debug("inside alert resolution graph before compiling")
     
     # Compile the graph
     return graph.compile()
@@ -811,15 +1101,17 @@ def run_alert_resolution(hours: int = 24) -> Dict[str, Any]:
         "matched_pairs": [],
         "closed_tickets": [],
         "manual_review_tickets": [],
-        "summary": {}
+        "summary": {},
+        # Run start time, stamped on the summary
+        "run_ts": datetime.now(timezone.utc).isoformat(timespec="seconds")
     }
     
-    print(f"Initial state created with hours={hours}")
+    logger.info("Initial state created with hours=%d", hours)
     
     try:
         # Fetch tickets directly to avoid potential issues with the graph
         tickets = fetch_tickets(hours)
-        print(f"Fetched {len(tickets)} tickets from the last {hours} hours")
+        logger.info("Fetched %d tickets from the last %d hours", len(tickets), hours)
         
         # Update initial state with fetched tickets
         initial_state["tickets"] = tickets
@@ -827,36 +1119,47 @@ def run_alert_resolution(hours: int = 24) -> Dict[str, Any]:
         # Categorize tickets
         try:
             state = categorize_tickets(initial_state)
-            print(f"Categorized {len(state['firing_alerts'])} firing alerts and {len(state['resolved_alerts'])} resolved alerts")
+            logger.info("Categorized %d firing alerts and %d resolved alerts", len(state["firing_alerts"]), len(state["resolved_alerts"]))
         except Exception as e:
-            print(f"Error in categorize_tickets: {str(e)}")
+            logger.error("Error in categorize_tickets: %s", e)
             initial_state["summary"] = {"error": f"Error categorizing tickets: {str(e)}"}
             return initial_state
         
         # Match alert pairs
         try:
             state = match_alert_pairs(state)
-            print(f"Found {len(state['matched_pairs'])} matched pairs and {len(state['manual_review_tickets'])} for manual review")
+            logger.info("Found %d matched pairs and %d for manual review", len(state["matched_pairs"]), len(state["manual_review_tickets"]))
         except Exception as e:
-            print(f"Error in match_alert_pairs: {str(e)}")
+            logger.error("Error in match_alert_pairs: %s", e)
             state["summary"] = {"error": f"Error matching alert pairs: {str(e)}"}
             return state
         
-        # Process matched pairs (auto-close)
-        try:
-            state = process_matched_pairs(state)
-            print(f"Processed {len(state['closed_tickets'])} tickets for auto-close")
-        except Exception as e:
-            print(f"Error in process_matched_pairs: {str(e)}")
-            state["summary"] = {"error": f"Error processing matched pairs: {str(e)}"}
-            return state
+        # Process matched pairs (auto-close) and send the manual review email at
+        # the same time; they write different state keys and only wait on I/O
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            closing = executor.submit(process_matched_pairs, state)
+            reviewing = executor.submit(handle_manual_review, state)
+            
+            try:
+                state = closing.result()
+                logger.info("Processed %d tickets for auto-close", len(state["closed_tickets"]))
+            except Exception as e:
+                logger.error("Error in process_matched_pairs: %s", e)
+                state["summary"] = {"error": f"Error processing matched pairs: {str(e)}"}
+                return state
+            
+            try:
+                reviewing.result()
+            except Exception as e:
+                logger.error("Error in handle_manual_review: %s", e)
+                state["email_sent"] = False
         
         # Generate summary
         try:
             state = generate_summary(state)
-            print("Generated summary successfully")
+            logger.info("Generated summary successfully")
         except Exception as e:
-            print(f"Error in generate_summary: {str(e)}")
+            logger.error("Error in generate_summary: %s", e)
             state["summary"] = {"error": f"Error generating summary: {str(e)}"}
         
         # Create a clean result dictionary with all required keys
@@ -871,18 +1174,17 @@ def run_alert_resolution(hours: int = 24) -> Dict[str, Any]:
         }
         
         # Log the final state for debugging
-        print(f"Final result: {len(result['tickets'])} tickets, {len(result['matched_pairs'])} matched pairs, {len(result['closed_tickets'])} closed")
+        logger.info("Final result: %d tickets, %d matched pairs, %d closed", len(result["tickets"]), len(result["matched_pairs"]), len(result["closed_tickets"]))
         
         return result
     except Exception as e:
-        print(f"Error in run_alert_resolution: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in run_alert_resolution: %s", e)
         # Return the initial state with error information
         initial_state["summary"] = {"error": str(e)}
         return initial_state
 
 if __name__ == "__main__":
-    # Run the alert resolution process for the last 24 hours
-    summary = run_alert_resolution(24)
-    print(f"Alert Resolution Summary: {json.dumps(summary, indent=2)}")
+    logging.basicConfig(level=logging.INFO)
+    # Run the alert resolution process for the last 24 hours; the summary and
+    # final counts are logged as part of the run
+    run_alert_resolution(24)
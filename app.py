@@ -1,14 +1,16 @@
 import streamlit as st
 import pandas as pd
-import datetime
 import json
+import orjson
 import requests
-import pandas as pd
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime, timedelta
 import time
 import os
 import sys
+from collections import deque
+from functools import lru_cache
 
 # Add the parent directory to the path to import from agents
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -21,8 +23,9 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Apply custom CSS
-st.markdown("""
+# Custom CSS, built once at import. Streamlit drops any element a rerun doesn't
+# emit again, so it is still sent on every rerun.
+CUSTOM_CSS = """
 <style>
     .main-header {
         font-size: 2.5rem;
@@ -86,22 +89,29 @@ st.markdown("""
         font-size: 0.8rem;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+# Apply custom CSS
+st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
 
 # Initialize session state
 if 'tickets' not in st.session_state:
     st.session_state.tickets = []
 if 'selected_ticket' not in st.session_state:
     st.session_state.selected_ticket = None
-if 'processing_history' not in st.session_state:
-    st.session_state.processing_history = {}
 if 'auto_refresh' not in st.session_state:
     st.session_state.auto_refresh = False
 if 'last_refresh' not in st.session_state:
     st.session_state.last_refresh = datetime.now()
+if 'processing_requested' not in st.session_state:
+    st.session_state.processing_requested = set()
+if 'processing_inflight' not in st.session_state:
+    st.session_state.processing_inflight = set()
 
-# API endpoint
+# API endpoint, overridable per session from the Settings tab
 API_ENDPOINT = "http://localhost:8000"
+if 'api_endpoint' not in st.session_state:
+    st.session_state.api_endpoint = API_ENDPOINT
 
 # Status and priority mappings
 STATUS_MAP = {
@@ -118,18 +128,65 @@ PRIORITY_MAP = {
     4: "Urgent"
 }
 
+# Names back to codes, so filters compare the integer columns
+STATUS_INV = {v: k for k, v in STATUS_MAP.items()}
+PRIORITY_INV = {v: k for k, v in PRIORITY_MAP.items()}
+
+# (connect, read) timeouts so a hung backend doesn't freeze the UI; agent and
+# alert resolution runs call the LLM and FreshService, so they get longer reads
+TIMEOUT = (3, 10)
+LONG_TIMEOUT = (3, 120)
+
+# Most recent agent runs kept per ticket
+HISTORY_PER_TICKET = 50
+
 # Functions
+@st.cache_resource
+def history_store():
+    """Agent processing history by ticket ID
+    
+    Kept in a process-wide resource rather than session state, so it isn't
+    carried through every rerun, and bounded per ticket.
+    """
+    return {}
+
+@st.cache_resource
+def get_session():
+    """Pooled keep-alive HTTP session shared by every rerun and user session"""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=10,
+        pool_maxsize=20,
+        max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=[502, 503, 504])
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    # Ticket lists are repetitive JSON and compress well
+    session.headers.update({"Accept-Encoding": "gzip, deflate", "Accept": "application/json"})
+    return session
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _cached_get(url, params=()):
+    """GET a JSON endpoint, caching the parsed response for 60 seconds across reruns
+    
+    params is a tuple of (key, value) pairs so it can be hashed. Failed responses
+    raise requests.HTTPError and are not cached.
+    """
+    response = get_session().get(url, params=dict(params), timeout=TIMEOUT)
+    response.raise_for_status()
+    return orjson.loads(response.content)
+
 def fetch_tickets(hours=24):
     """Fetch tickets from the API"""
     try:
-        response = requests.get(f"{API_ENDPOINT}/tickets/?hours={hours}")
-        if response.status_code == 200:
-            st.session_state.tickets = response.json()
-            st.session_state.last_refresh = datetime.now()
-            return True
-        else:
-            st.error(f"Failed to fetch tickets: {response.status_code}")
-            return False
+        st.session_state.tickets = _cached_get(f"{st.session_state.api_endpoint}/tickets/", (("hours", hours),))
+        # Build the display frame once per fetch instead of on every rerun
+        st.session_state.tickets_df = annotate_tickets(st.session_state.tickets)
+        st.session_state.last_refresh = datetime.now()
+        return True
+    except requests.HTTPError as e:
+        st.error(f"Failed to fetch tickets: {e.response.status_code}")
+        return False
     except Exception as e:
         st.error(f"Error connecting to API: {str(e)}")
         return False
@@ -137,44 +194,47 @@ def fetch_tickets(hours=24):
 def get_ticket_details(ticket_id):
     """Get details of a specific ticket"""
     try:
-        response = requests.get(f"{API_ENDPOINT}/tickets/{ticket_id}")
-        if response.status_code == 200:
-            # Parse the JSON response
-            data = response.json()
-            
-            # If the API returns a nested structure with 'ticket' key
-            if isinstance(data, dict) and 'ticket' in data:
-                ticket_data = data['ticket']
-            else:
-                ticket_data = data
-            
-            # Validate that we have a dictionary
-            if not isinstance(ticket_data, dict):
-                st.error(f"Invalid ticket data format: {type(ticket_data)}")
-                return {}
-                
-            # Return the ticket data with default values for critical fields
-            return {
-                'id': ticket_data.get('id', ticket_id),
-                'subject': ticket_data.get('subject', f'Ticket #{ticket_id}'),
-                'status': ticket_data.get('status'),
-                'priority': ticket_data.get('priority'),
-                'created_at': ticket_data.get('created_at'),
-                'updated_at': ticket_data.get('updated_at'),
-                'description': ticket_data.get('description', ''),
-                'requester_id': ticket_data.get('requester_id'),
-                'responder_id': ticket_data.get('responder_id'),
-                'group_id': ticket_data.get('group_id')
-            }
+        # Parse the JSON response
+        data = _cached_get(f"{st.session_state.api_endpoint}/tickets/{ticket_id}")
+        
+        # If the API returns a nested structure with 'ticket' key
+        if isinstance(data, dict) and 'ticket' in data:
+            ticket_data = data['ticket']
         else:
-            st.error(f"Failed to fetch ticket details: {response.status_code}")
+            ticket_data = data
+        
+        # Validate that we have a dictionary
+        if not isinstance(ticket_data, dict):
+            st.error(f"Invalid ticket data format: {type(ticket_data)}")
             return {}
+            
+        # Return the ticket data with default values for critical fields
+        return {
+            'id': ticket_data.get('id', ticket_id),
+            'subject': ticket_data.get('subject', f'Ticket #{ticket_id}'),
+            'status': ticket_data.get('status'),
+            'priority': ticket_data.get('priority'),
+            'created_at': ticket_data.get('created_at'),
+            'updated_at': ticket_data.get('updated_at'),
+            'description': ticket_data.get('description', ''),
+            'requester_id': ticket_data.get('requester_id'),
+            'responder_id': ticket_data.get('responder_id'),
+            'group_id': ticket_data.get('group_id')
+        }
+    except requests.HTTPError as e:
+        st.error(f"Failed to fetch ticket details: {e.response.status_code}")
+        return {}
     except Exception as e:
         st.error(f"Error connecting to API: {str(e)}")
         return {}
 
 def process_ticket_with_agent(ticket_id):
-    """Process a ticket with the agent"""
+    """Process a ticket with the agent, unless it is already being processed"""
+    inflight = st.session_state.processing_inflight
+    if ticket_id in inflight:
+        st.warning(f"Ticket #{ticket_id} is already being processed")
+        return False
+    inflight.add(ticket_id)
     try:
         # First get the ticket details
         ticket = get_ticket_details(ticket_id)
@@ -182,29 +242,29 @@ def process_ticket_with_agent(ticket_id):
             return False
         
         # Then send to the agent for processing
-        response = requests.post(
-            f"{API_ENDPOINT}/agent/action",
+        response = get_session().post(
+            f"{st.session_state.api_endpoint}/agent/action",
             json={
                 "ticket_id": ticket_id,
                 "action": "analyze",  # This will trigger the full agent workflow
                 "details": {}
-            }
+            },
+            timeout=LONG_TIMEOUT
         )
         
         if response.status_code == 200:
-            result = response.json()
+            result = orjson.loads(response.content)
             # Store the processing history
-            if ticket_id not in st.session_state.processing_history:
-                st.session_state.processing_history[ticket_id] = []
-            
-            st.session_state.processing_history[ticket_id].append({
+            history_store().setdefault(ticket_id, deque(maxlen=HISTORY_PER_TICKET)).append({
                 "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                 "action": result.get("action_taken", "unknown"),
                 "details": result.get("details", {})
             })
             
-            # Refresh the ticket list
-            fetch_tickets()
+            # The agent may have changed tickets; drop cached reads and let the
+            # caller's rerun refresh the list
+            _cached_get.clear()
+            st.session_state.needs_refetch = True
             return True
         else:
             st.error(f"Failed to process ticket: {response.status_code}")
@@ -212,11 +272,78 @@ def process_ticket_with_agent(ticket_id):
     except Exception as e:
         st.error(f"Error processing ticket: {str(e)}")
         return False
+    finally:
+        inflight.discard(ticket_id)
+
+def request_processing(ticket_id):
+    """Queue a ticket for the agent and rerun
+    
+    The agent then runs in a script run that draws every process button
+    disabled, so clicks made while it is processing are dropped.
+    """
+    st.session_state.processing_requested.add(ticket_id)
+    st.rerun()
 
+def processing_busy():
+    """Whether a ticket is queued for or being processed by the agent"""
+    return bool(st.session_state.processing_requested or st.session_state.processing_inflight)
+
+@st.cache_data(show_spinner=False)
+def annotate_tickets(tickets):
+    """DataFrame of the tickets with display columns added
+    
+    status_text/priority_text hold the mapped names and created_at_fmt/
+    updated_at_fmt the formatted timestamps. Cached on the ticket list, so
+    refetching unchanged tickets reuses the previous build.
+    """
+    df = pd.DataFrame(tickets)
+    if 'status' in df.columns:
+        df['status_text'] = df['status'].map(STATUS_MAP).fillna(df['status'].astype(str))
+    if 'priority' in df.columns:
+        df['priority_text'] = df['priority'].map(PRIORITY_MAP).fillna(df['priority'].astype(str))
+    # Parse each timestamp column in one vectorized pass; values that don't parse
+    # are shown as they are
+    for col in ('created_at', 'updated_at'):
+        if col in df.columns:
+            parsed = pd.to_datetime(df[col], format='ISO8601', utc=True, errors='coerce', cache=True)
+            df[f'{col}_fmt'] = parsed.dt.strftime("%Y-%m-%d %H:%M:%S").fillna(df[col].fillna("Unknown").astype(str))
+    return df
+
+def tickets_df():
+    """Annotated DataFrame of the last fetched tickets, empty before the first fetch"""
+    return st.session_state.get("tickets_df", pd.DataFrame())
+
+@st.cache_data(show_spinner=False)
+def analytics_counts(df):
+    """Status, priority and per-day ticket counts for the Analytics tab
+    
+    Cached on the tickets frame, so reruns that don't change the tickets reuse the
+    aggregations instead of recounting and reparsing created_at. A count is None
+    when the tickets have no such column.
+    """
+    status_counts = df['status_text'].value_counts() if 'status_text' in df.columns else None
+    priority_counts = df['priority_text'].value_counts() if 'priority_text' in df.columns else None
+    date_counts = None
+    if 'created_at' in df.columns:
+        # floor('D') keeps datetime64 days, which count and sort much faster than
+        # Python date objects
+        created = pd.to_datetime(df['created_at'], format='ISO8601', utc=True, errors='coerce')
+        date_counts = created.dt.floor('D').value_counts().sort_index()
+    return status_counts, priority_counts, date_counts
+
+# Identical timestamps repeat across reloads, so formatted values are memoized
+@lru_cache(maxsize=4096)
 def format_datetime(dt_str):
     """Format a datetime string for display"""
     if not dt_str:
         return "Unknown"
+    
+    # Fast path: ISO-8601 with or without "Z", fractional seconds or an offset
+    if isinstance(dt_str, str):
+        try:
+            return datetime.fromisoformat(dt_str.replace('Z', '+00:00')).strftime("%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            pass
         
     try:
         # Try different date formats
@@ -256,31 +383,27 @@ def format_datetime(dt_str):
 
 def fetch_data(api_url, endpoint, params=None):
     """Fetch data from the API"""
-    import requests
-    
     try:
         url = f"{api_url}{endpoint}"
-        response = requests.get(url, params=params)
-        
-        if response.status_code == 200:
-            return response.json()
-        else:
-            st.error(f"Error fetching data: {response.status_code} - {response.text}")
-            return None
+        return _cached_get(url, tuple(sorted((params or {}).items())))
+    except requests.HTTPError as e:
+        st.error(f"Error fetching data: {e.response.status_code} - {e.response.text}")
+        return None
     except Exception as e:
         st.error(f"Error connecting to API: {str(e)}")
         return None
 
 def post_data(api_url, endpoint, data=None, params=None):
     """Post data to the API"""
-    import requests
-    
     try:
         url = f"{api_url}{endpoint}"
-        response = requests.post(url, json=data, params=params)
+        response = get_session().post(url, json=data, params=params, timeout=LONG_TIMEOUT)
+        
+        # Posts change server state, so cached reads are stale
+        _cached_get.clear()
         
         if response.status_code in [200, 201]:
-            return response.json()
+            return orjson.loads(response.content)
         else:
             st.error(f"Error posting data: {response.status_code} - {response.text}")
             return None
@@ -312,18 +435,22 @@ def display_alert_resolution(api_url):
     """Display the alert resolution section"""
     st.subheader("Alert Resolution")
     
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        hours = st.slider("Hours to look back", min_value=1, max_value=72, value=24)
+    # The slider only takes effect on submit
+    with st.form("alert_resolution_form", clear_on_submit=False):
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            hours = st.slider("Hours to look back", min_value=1, max_value=72, value=24)
+        
+        with col2:
+            get_summary = st.form_submit_button("Get Alert Pairs Summary")
     
-    with col2:
-        if st.button("Get Alert Pairs Summary"):
-            with st.spinner("Analyzing tickets for alert pairs..."):
-                summary = fetch_data(api_url, f"/alerts/summary", {"hours": hours})
-                
-                if summary:
-                    st.session_state.alert_summary = summary
+    if get_summary:
+        with st.spinner("Analyzing tickets for alert pairs..."):
+            summary = fetch_data(api_url, f"/alerts/summary", {"hours": hours})
+            
+            if summary:
+                st.session_state.alert_summary = summary
     
     # Display summary if available
     if hasattr(st.session_state, 'alert_summary') and st.session_state.alert_summary:
@@ -394,36 +521,69 @@ with st.sidebar:
     with col1:
         if st.button("🔄 Refresh Now"):
             with st.spinner("Refreshing tickets..."):
+                # An explicit refresh always goes to the API
+                _cached_get.clear()
                 fetch_tickets()
     with col2:
         st.session_state.auto_refresh = st.checkbox("Auto Refresh", value=st.session_state.auto_refresh)
     
-    hours_options = [1, 2, 4, 8, 12, 24, 48, 72]
-    hours = st.selectbox("Fetch tickets from last:", hours_options, format_func=lambda x: f"{x} hours")
+    # API responses are cached for a minute; this forces the next reads to hit the API
+    if st.button("🧹 Clear Cache"):
+        _cached_get.clear()
     
-    # Filters
-    st.subheader("Filters")
-    status_filter = st.multiselect(
-        "Status:",
-        options=list(STATUS_MAP.values()),
-        default=list(STATUS_MAP.values())
-    )
+    # Look-back and filters are applied together when the form is submitted, so
+    # adjusting a widget doesn't rerun the page or refetch
+    with st.form("filters", clear_on_submit=False):
+        hours_options = [1, 2, 4, 8, 12, 24, 48, 72]
+        hours = st.selectbox("Fetch tickets from last:", hours_options, format_func=lambda x: f"{x} hours")
+        
+        # Filters
+        st.subheader("Filters")
+        status_filter = st.multiselect(
+            "Status:",
+            options=list(STATUS_MAP.values()),
+            default=list(STATUS_MAP.values())
+        )
+        
+        priority_filter = st.multiselect(
+            "Priority:",
+            options=list(PRIORITY_MAP.values()),
+            default=list(PRIORITY_MAP.values())
+        )
+        
+        submitted = st.form_submit_button("Apply")
     
-    priority_filter = st.multiselect(
-        "Priority:",
-        options=list(PRIORITY_MAP.values()),
-        default=list(PRIORITY_MAP.values())
-    )
+    if submitted or "applied_filters" not in st.session_state:
+        previous = st.session_state.get("applied_filters")
+        st.session_state.applied_filters = {"hours": hours, "status": status_filter, "priority": priority_filter}
+        # Only a changed look-back needs new tickets from the API
+        if submitted and previous and previous["hours"] != hours:
+            with st.spinner("Fetching tickets..."):
+                fetch_tickets(hours)
     
-    # Auto-refresh logic
-    if st.session_state.auto_refresh:
-        time_since_refresh = (datetime.now() - st.session_state.last_refresh).total_seconds()
-        if time_since_refresh > 60:  # Refresh every minute
-            fetch_tickets(hours)
-            st.session_state.last_refresh = datetime.now()
+    hours = st.session_state.applied_filters["hours"]
+    status_filter = st.session_state.applied_filters["status"]
+    priority_filter = st.session_state.applied_filters["priority"]
     
-    # Display last refresh time
-    st.caption(f"Last refreshed: {st.session_state.last_refresh.strftime('%Y-%m-%d %H:%M:%S')}")
+    # Refresh after an agent run, on the rerun it requested
+    if st.session_state.pop("needs_refetch", False):
+        fetch_tickets(hours)
+    
+    # Auto-refresh logic: while enabled, this fragment reruns on its own every
+    # minute and only reruns the whole page when the tickets actually changed
+    @st.fragment(run_every=60 if st.session_state.auto_refresh else None)
+    def auto_refresh_tickets():
+        if st.session_state.auto_refresh and (datetime.now() - st.session_state.last_refresh).total_seconds() >= 60:
+            previous = st.session_state.tickets
+            _cached_get.clear()
+            fetch_tickets(st.session_state.applied_filters["hours"])
+            if st.session_state.tickets != previous:
+                st.rerun()
+        
+        # Display last refresh time
+        st.caption(f"Last refreshed: {st.session_state.last_refresh.strftime('%Y-%m-%d %H:%M:%S')}")
+    
+    auto_refresh_tickets()
 
 # Main content
 st.markdown("<h1 class='main-header'>Cloud Ticket Resolution Dashboard</h1>", unsafe_allow_html=True)
@@ -439,51 +599,69 @@ with tab1:
             with st.spinner("Fetching tickets..."):
                 fetch_tickets(hours)
     else:
-        # Convert tickets to DataFrame for easier filtering
-        df = pd.DataFrame(st.session_state.tickets)
+        # Annotated frame built when the tickets were fetched
+        df = tickets_df()
         
-        # Apply filters
+        # Apply filters on the integer codes rather than the display text
         if 'status' in df.columns:
-            df['status_text'] = df['status'].apply(lambda x: STATUS_MAP.get(x, str(x)))
-            filtered_df = df[df['status_text'].isin(status_filter)]
+            status_codes = {STATUS_INV[v] for v in status_filter if v in STATUS_INV}
+            filtered_df = df[df['status'].isin(status_codes)]
         else:
             filtered_df = df
             
         if 'priority' in df.columns and len(filtered_df) > 0:
-            filtered_df['priority_text'] = filtered_df['priority'].apply(lambda x: PRIORITY_MAP.get(x, str(x)))
-            filtered_df = filtered_df[filtered_df['priority_text'].isin(priority_filter)]
+            priority_codes = {PRIORITY_INV[v] for v in priority_filter if v in PRIORITY_INV}
+            filtered_df = filtered_df[filtered_df['priority'].isin(priority_codes)]
         
         # Display ticket count
         st.markdown(f"<p class='sub-header'>Showing {len(filtered_df)} tickets</p>", unsafe_allow_html=True)
         
-        # Display tickets
-        for _, ticket in filtered_df.iterrows():
-            col1, col2 = st.columns([3, 1])
-            
-            with col1:
-                # Ticket card
-                st.markdown(f"""
-                <div class='card'>
-                    <h3>#{ticket['id']} - {ticket['subject']}</h3>
-                    <p>
-                        <span class='status-{STATUS_MAP.get(ticket['status'], "").lower()}'>{STATUS_MAP.get(ticket['status'], ticket['status'])}</span> | 
-                        <span class='priority-{ticket['priority']}'>{PRIORITY_MAP.get(ticket['priority'], ticket['priority'])}</span>
-                    </p>
-                    <p>Created: {format_datetime(ticket['created_at'])}</p>
-                    <p>Updated: {format_datetime(ticket['updated_at'])}</p>
-                </div>
-                """, unsafe_allow_html=True)
-            
-            with col2:
-                # Action buttons
-                if st.button("View Details", key=f"view_{ticket['id']}"):
-                    st.session_state.selected_ticket = ticket['id']
-                
-                if st.button("Process with Agent", key=f"process_{ticket['id']}"):
-                    with st.spinner(f"Processing ticket #{ticket['id']}..."):
-                        success = process_ticket_with_agent(ticket['id'])
-                        if success:
-                            st.success(f"Ticket #{ticket['id']} processed successfully!")
+        # Render one page of cards at a time; every card registers its own widgets
+        col1, col2 = st.columns(2)
+        with col1:
+            page_size = st.selectbox("Rows per page", [10, 25, 50, 100], index=1)
+        page_count = max(1, (len(filtered_df) + page_size - 1) // page_size)
+        # The page is held in session state only; it starts at 1 and is kept
+        # in range when filters or page size shrink the list
+        if "ticket_page" not in st.session_state:
+            st.session_state.ticket_page = 1
+        elif st.session_state.ticket_page > page_count:
+            st.session_state.ticket_page = page_count
+        with col2:
+            page = st.number_input("Page", min_value=1, max_value=page_count, key="ticket_page")
+        view = filtered_df.iloc[(page - 1) * page_size:page * page_size]
+        
+        # Display the page as one table; the actions below apply to the selected row
+        display_columns = [col for col in ("id", "subject", "status_text", "priority_text", "created_at_fmt", "updated_at_fmt") if col in view.columns]
+        selection = st.dataframe(
+            view[display_columns],
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                "id": "ID",
+                "subject": "Subject",
+                "status_text": "Status",
+                "priority_text": "Priority",
+                "created_at_fmt": "Created",
+                "updated_at_fmt": "Updated"
+            },
+            on_select="rerun",
+            selection_mode="single-row",
+            key="ticket_table"
+        )
+        
+        selected_rows = selection.selection.rows
+        selected_id = int(view.iloc[selected_rows[0]]["id"]) if selected_rows else None
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("View Details", disabled=selected_id is None):
+                st.session_state.selected_ticket = selected_id
+        with col2:
+            if st.button("Process with Agent", disabled=selected_id is None or processing_busy()):
+                request_processing(selected_id)
+            # Queued tickets are processed here once every process button is drawn
+            processing_slot = st.container()
         
         # Ticket details modal
         if st.session_state.selected_ticket:
@@ -515,9 +693,9 @@ with tab1:
                     st.markdown(ticket_details.get('description', 'No description provided'))
                     
                     # Processing history
-                    if ticket_id in st.session_state.processing_history:
+                    if ticket_id in history_store():
                         st.markdown("### Processing History")
-                        for entry in st.session_state.processing_history[ticket_id]:
+                        for entry in history_store()[ticket_id]:
                             st.markdown(f"**{entry['timestamp']}** - Action: {entry['action']}")
                             st.json(entry['details'])
                     
@@ -525,33 +703,46 @@ with tab1:
                     st.markdown("### Actions")
                     col1, col2, col3 = st.columns(3)
                     with col1:
-                        if st.button("Process with Agent", key=f"process_detail_{ticket_id}"):
-                            with st.spinner(f"Processing ticket #{ticket_id}..."):
-                                success = process_ticket_with_agent(ticket_id)
-                                if success:
-                                    st.success(f"Ticket #{ticket_id} processed successfully!")
+                        if st.button("Process with Agent", key=f"process_detail_{ticket_id}", disabled=processing_busy()):
+                            request_processing(ticket_id)
                     with col2:
                         if st.button("Close", key=f"close_{ticket_id}"):
                             st.session_state.selected_ticket = None
                             st.experimental_rerun()
+        
+        # Run the agent on queued tickets, after the buttons above were drawn disabled
+        with processing_slot:
+            for ticket_id in sorted(st.session_state.processing_requested):
+                st.session_state.processing_requested.discard(ticket_id)
+                with st.spinner(f"Processing ticket #{ticket_id}..."):
+                    success = process_ticket_with_agent(ticket_id)
+                if success:
+                    # Shown after the rerun that refreshes the ticket list
+                    st.session_state.processed_notice = f"Ticket #{ticket_id} processed successfully!"
+                    st.rerun()
+            if "processed_notice" in st.session_state:
+                st.success(st.session_state.pop("processed_notice"))
 
 with tab2:
     st.markdown("<h2 class='sub-header'>Alert Resolution</h2>", unsafe_allow_html=True)
     
-    # Alert resolution section
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        hours = st.slider("Hours to look back", min_value=1, max_value=72, value=24)
+    # Alert resolution section; the slider only takes effect on submit
+    with st.form("alert_summary_form", clear_on_submit=False):
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            alert_hours = st.slider("Hours to look back", min_value=1, max_value=72, value=24)
+        
+        with col2:
+            get_summary = st.form_submit_button("Get Alert Pairs Summary")
     
-    with col2:
-        if st.button("Get Alert Pairs Summary"):
-            with st.spinner("Analyzing tickets for alert pairs..."):
-                api_url = st.session_state.get("api_url", "http://localhost:8000")
-                summary = fetch_data(api_url, f"/alerts/summary", {"hours": hours})
-                
-                if summary:
-                    st.session_state.alert_summary = summary
+    if get_summary:
+        with st.spinner("Analyzing tickets for alert pairs..."):
+            api_url = st.session_state.api_endpoint
+            summary = fetch_data(api_url, f"/alerts/summary", {"hours": alert_hours})
+            
+            if summary:
+                st.session_state.alert_summary = summary
     
     # Display summary if available
     if "alert_summary" in st.session_state and st.session_state.alert_summary:
@@ -575,8 +766,8 @@ with tab2:
             
             if st.button("Execute Auto-Close"):
                 with st.spinner("Closing matched alert pairs..."):
-                    api_url = st.session_state.get("api_url", "http://localhost:8000")
-                    result = post_data(api_url, "/alerts/resolve", params={"hours": hours})
+                    api_url = st.session_state.api_endpoint
+                    result = post_data(api_url, "/alerts/resolve", params={"hours": alert_hours})
                     
                     if result and result.get("success"):
                         st.success("Successfully closed matched alert pairs!")
@@ -604,47 +795,38 @@ with tab3:
     st.markdown("<h2 class='sub-header'>Ticket Analytics</h2>", unsafe_allow_html=True)
     
     if st.session_state.tickets:
-        df = pd.DataFrame(st.session_state.tickets)
-        
-        # Add text columns
-        if 'status' in df.columns:
-            df['status_text'] = df['status'].apply(lambda x: STATUS_MAP.get(x, str(x)))
-        if 'priority' in df.columns:
-            df['priority_text'] = df['priority'].apply(lambda x: PRIORITY_MAP.get(x, str(x)))
+        status_counts, priority_counts, date_counts = analytics_counts(tickets_df())
         
         col1, col2 = st.columns(2)
         
         with col1:
             # Status distribution
-            if 'status_text' in df.columns:
+            if status_counts is not None:
                 st.subheader("Tickets by Status")
-                status_counts = df['status_text'].value_counts()
                 st.bar_chart(status_counts)
         
         with col2:
             # Priority distribution
-            if 'priority_text' in df.columns:
+            if priority_counts is not None:
                 st.subheader("Tickets by Priority")
-                priority_counts = df['priority_text'].value_counts()
                 st.bar_chart(priority_counts)
         
         # Tickets over time
-        if 'created_at' in df.columns:
+        if date_counts is not None:
             st.subheader("Tickets Created Over Time")
-            df['created_date'] = pd.to_datetime(df['created_at']).dt.date
-            date_counts = df['created_date'].value_counts().sort_index()
             st.line_chart(date_counts)
     else:
         st.info("No ticket data available for analytics.")
 
-with tab3:
+with tab4:
     st.markdown("<h2 class='sub-header'>System Settings</h2>", unsafe_allow_html=True)
     
     st.subheader("API Configuration")
-    api_endpoint = st.text_input("API Endpoint", value=API_ENDPOINT)
+    api_endpoint = st.text_input("API Endpoint", value=st.session_state.api_endpoint)
     
     if st.button("Save Settings"):
-        API_ENDPOINT = api_endpoint
+        # Cached reads are keyed on the full URL, so the new endpoint is fetched fresh
+        st.session_state.api_endpoint = api_endpoint
         st.success("Settings saved successfully!")
     
     st.subheader("Agent Configuration")
@@ -660,7 +842,7 @@ with tab3:
     # Test connection
     if st.button("Test API Connection"):
         try:
-            response = requests.get(f"{API_ENDPOINT}/")
+            response = get_session().get(f"{st.session_state.api_endpoint}/", timeout=TIMEOUT)
             if response.status_code == 200:
                 st.success("API connection successful!")
             else:
@@ -1,9 +1,22 @@
 import os
 import json
-from typing import List, Dict, Any, Optional
-from langchain_groq import GroqEmbeddings
+import math
+import uuid
+import hashlib
+import sqlite3
+import atexit
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from typing import List, Dict, Any, Optional, Tuple
+import faiss
+import numpy as np
+import orjson
 from langchain_core.documents import Document
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.embeddings import FastEmbedEmbeddings
 from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_groq import ChatGroq
@@ -12,6 +25,44 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
+# Knowledge bases with at least this many tickets are indexed with IVF-PQ;
+# smaller ones use an HNSW graph, which gives near-exact recall with low
+# latency for small k and needs no training
+IVFPQ_MIN_VECTORS = int(os.getenv("IVFPQ_MIN_VECTORS", "1000000"))
+PQ_M = int(os.getenv("PQ_M", "8"))  # sub-quantizers; must divide the embedding size
+PQ_NBITS = 8
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "10"))  # inverted lists scanned per query
+HNSW_M = int(os.getenv("HNSW_M", "32"))  # graph neighbours per vector
+HNSW_EF_CONSTRUCTION = 200
+
+# HNSW vectors are stored as 8-bit scalar-quantized codes, a quarter of the
+# float32 size, once there are enough of them to train the per-dimension ranges
+SQ8_MIN_VECTORS = int(os.getenv("SQ8_MIN_VECTORS", "1000"))
+EF_SEARCH = int(os.getenv("EF_SEARCH", "64"))  # candidates explored per query
+
+# Vectors are L2-normalized and searched by inner product, i.e. cosine similarity
+VECTOR_STORE_OPTIONS = {
+    "normalize_L2": True,
+    "distance_strategy": DistanceStrategy.MAX_INNER_PRODUCT
+}
+
+# Texts sent per embedding request when indexing the knowledge base
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "256"))
+
+# Hashes looked up per embedding cache query, under SQLite's bound parameter limit
+EMBED_CACHE_LOOKUP_SIZE = 900
+
+# Resolution suggestions are reused for tickets whose query embedding has at
+# least this cosine similarity to one already answered
+SUGGESTION_CACHE_SIZE = int(os.getenv("SUGGESTION_CACHE_SIZE", "10000"))
+SUGGESTION_CACHE_MIN_SIMILARITY = float(os.getenv("SUGGESTION_CACHE_MIN_SIMILARITY", "0.85"))
+
+# Added tickets are logged to an append-only pending file and the full vector
+# store is only rewritten after this many adds, or on flush() and at exit
+VECTOR_STORE_FLUSH_EVERY = int(os.getenv("VECTOR_STORE_FLUSH_EVERY", "32"))
+PENDING_VECTORS_FILE = "pending_vectors.f32"
+PENDING_META_FILE = "pending_meta.jsonl"
+
 class KnowledgeRetriever:
     """
     A class to retrieve relevant knowledge from past tickets to help resolve current tickets.
@@ -25,170 +76,553 @@ class KnowledgeRetriever:
             knowledge_base_dir: Directory containing the knowledge base files
         """
         self.knowledge_base_dir = knowledge_base_dir
-        self.embeddings = GroqEmbeddings(model=os.getenv("LLM_MODEL", "llama3-70b-8192"))
+        # Groq serves no embedding models, so tickets are embedded locally
+        self.embedding_model = os.getenv("EMBEDDING_MODEL", "BAAI/bge-small-en-v1.5")
+        self.embeddings = FastEmbedEmbeddings(model_name=self.embedding_model)
+        self._embed_cache_db = None
+        # Semantic cache of resolution suggestions: normalized query vectors in an
+        # inner-product index, and the suggestions by ID in least recently used order
+        self._suggestion_index = None
+        self._suggestions = OrderedDict()
+        self._next_suggestion_id = 0
+        self._dirty_adds = 0
+        
+        # Chain that generates resolution suggestions, built once and reused
+        llm = ChatGroq(model=os.getenv("LLM_MODEL", "llama3-70b-8192"), temperature=0)
+        prompt = ChatPromptTemplate.from_template(
+            """You are an expert cloud support analyst. Based on the current ticket and similar past tickets,
+            suggest a resolution for the current ticket.
+            
+            Current Ticket:
+            Subject: {subject}
+            Description: {description}
+            
+            Similar Past Tickets:
+            {context}
+            
+            Provide a concise resolution suggestion that could help resolve the current ticket.
+            Include specific steps if applicable.
+            """
+        )
+        self._suggestion_chain = prompt | llm | StrOutputParser()
+        
         self.vector_store = None
         self.initialize_vector_store()
+        atexit.register(self.flush)
     
     def initialize_vector_store(self):
         """Initialize the vector store from the knowledge base files"""
-        # Check if the knowledge base directory exists
+        # Check if the knowledge base directory exists. The vector store stays
+        # None until there is a document to index, as the index size isn't
+        # known before the first embedding
         if not os.path.exists(self.knowledge_base_dir):
             os.makedirs(self.knowledge_base_dir)
-            # Create an empty vector store
-            self.vector_store = FAISS.from_texts(
-                ["Placeholder document"], self.embeddings
-            )
             return
         
         # Check if there's a persisted vector store
         vector_store_path = os.path.join(self.knowledge_base_dir, "vector_store")
         if os.path.exists(vector_store_path):
-            # Load the existing vector store
-            self.vector_store = FAISS.load_local(vector_store_path, self.embeddings)
+            # Load the existing vector store; its docstore is a pickle, which
+            # is only safe because this class is the one that wrote it
+            self.vector_store = FAISS.load_local(
+                vector_store_path, self.embeddings, allow_dangerous_deserialization=True, **VECTOR_STORE_OPTIONS
+            )
+            if self.vector_store.index.metric_type != faiss.METRIC_INNER_PRODUCT:
+                # Stores saved before the switch to cosine similarity are rebuilt
+                self.vector_store = None
+        
+        if self.vector_store is not None:
+            self._tune_index(self.vector_store.index)
+            # Add tickets logged since the store was last written
+            self._replay_pending()
         else:
-            # Create a new vector store from the knowledge base files
-            documents = self._load_documents()
-            if documents:
-                self.vector_store = FAISS.from_documents(documents, self.embeddings)
+            # Create a new vector store from the knowledge base files. Pending
+            # adds are already in the JSON backups, so their log is dropped
+            self._clear_pending()
+            contents, metadatas = self._load_documents()
+            if contents:
+                vectors = self._cached_embed(contents)
+                self.vector_store = self._vector_store_from(contents, metadatas, vectors)
                 # Save the vector store
                 self.vector_store.save_local(vector_store_path)
+    
+    def _has_documents(self) -> bool:
+        """Whether the vector store holds any documents to search"""
+        return self.vector_store is not None and self.vector_store.index.ntotal > 0
+    
+    def _pending_paths(self) -> Tuple[str, str]:
+        """Paths of the pending-add vector and metadata logs"""
+        return (
+            os.path.join(self.knowledge_base_dir, PENDING_VECTORS_FILE),
+            os.path.join(self.knowledge_base_dir, PENDING_META_FILE)
+        )
+    
+    def _append_pending(self, content: str, metadata: Dict[str, Any], vector: np.ndarray):
+        """
+        Log an added document so it survives a restart before the next flush.
+        
+        Args:
+            content: The document text
+            metadata: The document metadata
+            vector: The document embedding
+        """
+        vectors_path, meta_path = self._pending_paths()
+        with open(vectors_path, "ab") as f:
+            f.write(np.asarray(vector, dtype=np.float32).tobytes())
+        with open(meta_path, "a") as f:
+            f.write(json.dumps({"content": content, "metadata": metadata}) + "\n")
+    
+    def _clear_pending(self):
+        """Remove the pending-add logs"""
+        for path in self._pending_paths():
+            if os.path.exists(path):
+                os.remove(path)
+    
+    def _replay_pending(self):
+        """Add the logged documents to the loaded vector store and write it out"""
+        vectors_path, meta_path = self._pending_paths()
+        if not os.path.exists(meta_path) or not os.path.exists(vectors_path):
+            self._clear_pending()
+            return
+        
+        with open(meta_path, "r") as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        d = self.vector_store.index.d
+        vectors = np.fromfile(vectors_path, dtype=np.float32)
+        vectors = vectors[:vectors.size // d * d].reshape(-1, d)
+        
+        # An interrupted append can leave one log a row longer than the other
+        count = min(len(entries), len(vectors))
+        if count:
+            self.vector_store.add_embeddings(
+                [(entry["content"], vector.tolist()) for entry, vector in zip(entries, vectors[:count])],
+                metadatas=[entry["metadata"] for entry in entries[:count]]
+            )
+            self._dirty_adds += count
+        self.flush()
+        self._clear_pending()
+    
+    def flush(self):
+        """Write the vector store to disk if documents were added since the last write"""
+        if self.vector_store is None or not self._dirty_adds:
+            return
+        self._rebuild_if_outgrown()
+        vector_store_path = os.path.join(self.knowledge_base_dir, "vector_store")
+        self.vector_store.save_local(vector_store_path)
+        self._clear_pending()
+        self._dirty_adds = 0
+    
+    def _rebuild_if_outgrown(self):
+        """
+        Rebuild the index once adds have grown it past the size _build_index
+        picks a more compact index type for.
+        
+        A knowledge base started empty is created as a flat HNSW index from its
+        first document, and a saved store is reloaded as it was written, so
+        without this it would never be quantized. The vectors are read back
+        from the embedding cache, so rebuilding makes no embedding calls.
+        """
+        index = self.vector_store.index
+        n = index.ntotal
+        if not (
+            (isinstance(index, faiss.IndexHNSWFlat) and n >= SQ8_MIN_VECTORS)
+            or (isinstance(index, faiss.IndexHNSW) and n >= IVFPQ_MIN_VECTORS and not index.d % PQ_M)
+        ):
+            return
+        
+        docstore = self.vector_store.docstore
+        documents = [docstore.search(self.vector_store.index_to_docstore_id[i]) for i in range(n)]
+        contents = [document.page_content for document in documents]
+        self.vector_store = self._vector_store_from(
+            contents, [document.metadata for document in documents], self._cached_embed(contents)
+        )
+    
+    def _embed_texts(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed texts in batches of EMBED_BATCH_SIZE.
+        
+        Args:
+            texts: The texts to embed
+            
+        Returns:
+            float32 matrix with one row per text
+        """
+        # Each batch is copied straight into a matrix allocated once the
+        # embedding size is known, rather than collecting every vector as lists
+        vectors = np.empty((len(texts), 0), dtype=np.float32)
+        for start in range(0, len(texts), EMBED_BATCH_SIZE):
+            batch = np.asarray(
+                self.embeddings.embed_documents(texts[start:start + EMBED_BATCH_SIZE]), dtype=np.float32
+            )
+            if start == 0:
+                vectors = np.empty((len(texts), batch.shape[1]), dtype=np.float32)
+            vectors[start:start + len(batch)] = batch
+        return vectors
+    
+    def _embed_cache(self) -> sqlite3.Connection:
+        """Open the on-disk embedding cache on first use"""
+        if self._embed_cache_db is None:
+            os.makedirs(self.knowledge_base_dir, exist_ok=True)
+            db = sqlite3.connect(
+                os.path.join(self.knowledge_base_dir, "embed_cache.db"), check_same_thread=False
+            )
+            db.execute("CREATE TABLE IF NOT EXISTS embeddings (hash TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+            self._embed_cache_db = db
+        return self._embed_cache_db
+    
+    def _cached_embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed texts, reusing vectors already computed for the same text and model.
+        
+        Vectors are cached in knowledge_base_dir/embed_cache.db keyed by a SHA-256
+        of the model name and text, so restarts only embed texts not seen before.
+        The misses are embedded together in batches.
+        
+        Args:
+            texts: The texts to embed
+            
+        Returns:
+            float32 matrix with one row per text, in the order given
+        """
+        hashes = [
+            hashlib.sha256(f"{self.embedding_model}\0{text}".encode()).hexdigest()
+            for text in texts
+        ]
+        db = self._embed_cache()
+        
+        vectors = {}
+        unique = list(dict.fromkeys(hashes))
+        for start in range(0, len(unique), EMBED_CACHE_LOOKUP_SIZE):
+            chunk = unique[start:start + EMBED_CACHE_LOOKUP_SIZE]
+            rows = db.execute(
+                f"SELECT hash, vector FROM embeddings WHERE hash IN ({','.join('?' * len(chunk))})", chunk
+            )
+            vectors.update((h, np.frombuffer(blob, dtype=np.float32)) for h, blob in rows)
+        
+        misses = {h: text for h, text in zip(hashes, texts) if h not in vectors}
+        if misses:
+            vectors.update(zip(misses, self._embed_texts(list(misses.values()))))
+            with db:
+                db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (hash, vector) VALUES (?, ?)",
+                    [(h, vectors[h].tobytes()) for h in misses]
+                )
+        
+        return np.stack([vectors[h] for h in hashes])
+    
+    def _build_index(self, vectors: np.ndarray):
+        """
+        Build a FAISS index over the embedding vectors.
+        
+        Uses IVF-PQ for very large knowledge bases, so queries scan only nprobe
+        inverted lists of compressed codes, and an HNSW graph otherwise, over
+        8-bit scalar-quantized vectors when there are enough to train on. The
+        vectors are L2-normalized in place and indexed by inner product.
+        
+        Args:
+            vectors: float32 matrix of shape (N, d)
+            
+        Returns:
+            The populated index
+        """
+        faiss.normalize_L2(vectors)
+        n, d = vectors.shape
+        if n < IVFPQ_MIN_VECTORS or d % PQ_M:
+            if n < SQ8_MIN_VECTORS:
+                index = faiss.IndexHNSWFlat(d, HNSW_M, faiss.METRIC_INNER_PRODUCT)
             else:
-                # Create an empty vector store
-                self.vector_store = FAISS.from_texts(
-                    ["Placeholder document"], self.embeddings
+                index = faiss.IndexHNSWSQ(
+                    d, faiss.ScalarQuantizer.QT_8bit, HNSW_M, faiss.METRIC_INNER_PRODUCT
                 )
+                index.train(vectors)
+            index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        else:
+            nlist = int(math.sqrt(n))
+            index = faiss.IndexIVFPQ(
+                faiss.IndexFlatIP(d), d, nlist, PQ_M, PQ_NBITS, faiss.METRIC_INNER_PRODUCT
+            )
+            index.train(vectors)
+        index.add(vectors)
+        return index
     
-    def _load_documents(self) -> List[Document]:
-        """Load documents from the knowledge base files"""
-        documents = []
-        
-        # Look for JSON files in the knowledge base directory
-        for filename in os.listdir(self.knowledge_base_dir):
-            if filename.endswith(".json") and filename != "vector_store.json":
-                file_path = os.path.join(self.knowledge_base_dir, filename)
-                try:
-                    with open(file_path, "r") as f:
-                        tickets = json.load(f)
-                        
-                    # Convert each ticket to a document
-                    for ticket in tickets:
-                        # Create the document content
-                        content = f"""
-                        Ticket ID: {ticket.get('id')}
-                        Subject: {ticket.get('subject')}
-                        Description: {ticket.get('description', 'No description provided')}
-                        Status: {ticket.get('status')}
-                        Priority: {ticket.get('priority')}
-                        Resolution: {ticket.get('resolution', 'No resolution provided')}
-                        """
-                        
-                        # Create metadata
-                        metadata = {
-                            "ticket_id": ticket.get('id'),
-                            "subject": ticket.get('subject'),
-                            "status": ticket.get('status'),
-                            "priority": ticket.get('priority'),
-                            "category": ticket.get('category', 'unknown')
-                        }
-                        
-                        # Create the document
-                        doc = Document(page_content=content, metadata=metadata)
-                        documents.append(doc)
-                        
-                except Exception as e:
-                    print(f"Error loading knowledge base file {filename}: {str(e)}")
-        
-        return documents
+    def _tune_index(self, index):
+        """Apply the query-time search parameters to an index"""
+        if isinstance(index, faiss.IndexIVF):
+            index.nprobe = IVF_NPROBE
+        elif isinstance(index, faiss.IndexHNSW):
+            index.hnsw.efSearch = EF_SEARCH
     
-    def add_ticket_to_knowledge_base(self, ticket: Dict[str, Any], resolution: Optional[str] = None):
+    def _vector_store_from(self, contents: List[str], metadatas: List[Dict[str, Any]], vectors: np.ndarray) -> FAISS:
         """
-        Add a resolved ticket to the knowledge base.
+        Wrap an index built from precomputed embeddings in a LangChain vector store.
         
         Args:
-            ticket: The ticket data
-            resolution: The resolution of the ticket
+            contents: The document texts
+            metadatas: The document metadata, parallel to contents
+            vectors: The embeddings of contents, one row per document
+            
+        Returns:
+            The vector store
         """
-        # Add resolution to the ticket if provided
-        if resolution:
-            ticket["resolution"] = resolution
+        ids = [str(uuid.uuid4()) for _ in contents]
+        docstore = InMemoryDocstore({
+            doc_id: Document(page_content=content, metadata=metadata)
+            for doc_id, content, metadata in zip(ids, contents, metadatas)
+        })
+        index = self._build_index(vectors)
+        self._tune_index(index)
+        return FAISS(
+            embedding_function=self.embeddings,
+            index=index,
+            docstore=docstore,
+            index_to_docstore_id=dict(enumerate(ids)),
+            **VECTOR_STORE_OPTIONS
+        )
+    
+    @staticmethod
+    def _format_ticket_text(ticket: Dict[str, Any]) -> str:
+        """
+        Build the document text embedded for a ticket.
         
-        # Create the document content
-        content = f"""
-        Ticket ID: {ticket.get('id')}
-        Subject: {ticket.get('subject')}
-        Description: {ticket.get('description', 'No description provided')}
-        Status: {ticket.get('status')}
-        Priority: {ticket.get('priority')}
-        Resolution: {ticket.get('resolution', 'No resolution provided')}
+        One unindented line per field, so no tokens are spent on whitespace.
+        
+        Args:
+            ticket: The ticket data
+            
+        Returns:
+            The document content
         """
+        return (
+            f"Ticket ID: {ticket.get('id')}\n"
+            f"Subject: {ticket.get('subject')}\n"
+            f"Description: {ticket.get('description', 'No description provided')}\n"
+            f"Status: {ticket.get('status')}\n"
+            f"Priority: {ticket.get('priority')}\n"
+            f"Resolution: {ticket.get('resolution', 'No resolution provided')}"
+        )
+    
+    @staticmethod
+    def _format_query_text(ticket: Dict[str, Any]) -> str:
+        """
+        Build the query text embedded when looking up tickets similar to one.
+        
+        Unindented like _format_ticket_text, and built the same way on every
+        call, so asking about the same ticket again reuses its cached embedding.
         
-        # Create metadata
-        metadata = {
+        Args:
+            ticket: The ticket data
+            
+        Returns:
+            The query text
+        """
+        return (
+            f"Subject: {ticket.get('subject')}\n"
+            f"Description: {ticket.get('description', 'No description provided')}"
+        )
+    
+    @staticmethod
+    def _ticket_metadata(ticket: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the document metadata stored for a ticket"""
+        return {
             "ticket_id": ticket.get('id'),
             "subject": ticket.get('subject'),
             "status": ticket.get('status'),
             "priority": ticket.get('priority'),
             "category": ticket.get('category', 'unknown')
         }
+    
+    @staticmethod
+    def _load_jsonl_tickets(f, filename: str) -> List[Dict[str, Any]]:
+        """
+        Decode a JSON Lines ticket file one line at a time.
         
-        # Create the document
-        doc = Document(page_content=content, metadata=metadata)
+        A line that doesn't decode, typically a tail cut off by a crash during
+        an append, is skipped so the rest of the file still loads.
         
-        # Add the document to the vector store
-        if self.vector_store:
-            self.vector_store.add_documents([doc])
+        Args:
+            f: The file, opened in binary mode
+            filename: The file name, for the error message
             
-            # Save the updated vector store
-            vector_store_path = os.path.join(self.knowledge_base_dir, "vector_store")
-            self.vector_store.save_local(vector_store_path)
+        Returns:
+            The decoded tickets
+        """
+        tickets = []
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                tickets.append(orjson.loads(line))
+            except orjson.JSONDecodeError as e:
+                print(f"Skipping unreadable line {line_number} of knowledge base file {filename}: {str(e)}")
+        return tickets
+    
+    def _load_file(self, file_path: str) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """
+        Load the documents of one knowledge base file.
+        
+        Args:
+            file_path: A JSON Lines file, or a JSON array file from older versions
+            
+        Returns:
+            Parallel lists of document contents and metadata; empty if the file
+            can't be read
+        """
+        contents = []
+        metadatas = []
+        try:
+            with open(file_path, "rb") as f:
+                if file_path.endswith(".jsonl"):
+                    tickets = self._load_jsonl_tickets(f, os.path.basename(file_path))
+                else:
+                    tickets = orjson.loads(f.read())
+                
+            # Convert each ticket to a document
+            for ticket in tickets:
+                contents.append(self._format_ticket_text(ticket))
+                metadatas.append(self._ticket_metadata(ticket))
+                
+        except Exception as e:
+            print(f"Error loading knowledge base file {os.path.basename(file_path)}: {str(e)}")
+        
+        return contents, metadatas
+    
+    def _load_documents(self) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """
+        Load documents from the knowledge base files.
+        
+        Returns:
+            Parallel lists of document contents and metadata, so the contents
+            can be embedded in bulk
+        """
+        # Look for ticket files in the knowledge base directory: JSON Lines as
+        # written by _save_ticket_to_json, and JSON arrays from older versions
+        file_paths = [
+            os.path.join(self.knowledge_base_dir, filename)
+            for filename in sorted(os.listdir(self.knowledge_base_dir))
+            if (filename.endswith(".jsonl") and filename != PENDING_META_FILE)
+            or (filename.endswith(".json") and filename != "vector_store.json")
+        ]
+        
+        # Read the files concurrently so their I/O overlaps; map keeps file order
+        max_workers = max(1, min(8, (os.cpu_count() or 1) * 2, len(file_paths)))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            loaded = list(executor.map(self._load_file, file_paths))
+        
+        contents = list(chain.from_iterable(file_contents for file_contents, _ in loaded))
+        metadatas = list(chain.from_iterable(file_metadatas for _, file_metadatas in loaded))
+        return contents, metadatas
+    
+    def add_ticket_to_knowledge_base(self, ticket: Dict[str, Any], resolution: Optional[str] = None):
+        """
+        Add a resolved ticket to the knowledge base.
+        
+        Args:
+            ticket: The ticket data
+            resolution: The resolution of the ticket
+        """
+        # Add resolution to the ticket if provided
+        if resolution:
+            ticket["resolution"] = resolution
+        
+        # Create the document content and metadata
+        content = self._format_ticket_text(ticket)
+        metadata = self._ticket_metadata(ticket)
+        
+        # Add the document to the vector store, embedding through the cache; the
+        # first document of an empty knowledge base creates the store
+        vector = self._cached_embed([content])[0]
+        if self.vector_store is None:
+            self.vector_store = self._vector_store_from([content], [metadata], vector[np.newaxis])
+        else:
+            self.vector_store.add_embeddings([(content, vector.tolist())], metadatas=[metadata])
+        
+        # Log the add, and rewrite the whole store only every few adds
+        self._append_pending(content, metadata, vector)
+        self._dirty_adds += 1
+        if self._dirty_adds >= VECTOR_STORE_FLUSH_EVERY:
+            self.flush()
         
         # Also save to a JSON file for backup
         self._save_ticket_to_json(ticket)
     
     def _save_ticket_to_json(self, ticket: Dict[str, Any]):
-        """Save a ticket to a JSON file"""
+        """Append a ticket to its category's JSON Lines file"""
         # Determine the category for filing
         category = ticket.get('category', 'general')
         
         # Create the filename
-        filename = f"{category}_tickets.json"
+        filename = f"{category}_tickets.jsonl"
         file_path = os.path.join(self.knowledge_base_dir, filename)
         
-        # Load existing tickets or create a new list
-        if os.path.exists(file_path):
-            try:
-                with open(file_path, "r") as f:
-                    tickets = json.load(f)
-            except:
-                tickets = []
-        else:
-            tickets = []
-        
-        # Add the new ticket
-        tickets.append(ticket)
-        
-        # Save the updated list
-        with open(file_path, "w") as f:
-            json.dump(tickets, f, indent=2)
+        # One line per ticket, so adding doesn't reread or rewrite the file
+        with open(file_path, "ab") as f:
+            f.write(orjson.dumps(ticket, option=orjson.OPT_APPEND_NEWLINE))
     
-    def retrieve_similar_tickets(self, query: str, k: int = 3) -> List[Document]:
+    def retrieve_similar_tickets(self, query: str, k: int = 3, query_vector: Optional[np.ndarray] = None) -> List[Document]:
         """
         Retrieve similar tickets from the knowledge base.
         
         Args:
             query: The query to search for
             k: The number of similar tickets to retrieve
+            query_vector: The query's embedding, if the caller already has it
             
         Returns:
             A list of similar tickets
         """
-        if not self.vector_store:
+        if not self._has_documents():
             return []
         
+        # Embed through the cache, so a repeated query costs no embedding call
+        if query_vector is None:
+            query_vector = self._cached_embed([query])
+        
         # Search for similar tickets
-        docs = self.vector_store.similarity_search(query, k=k)
+        docs = self.vector_store.similarity_search_by_vector(query_vector.reshape(-1).tolist(), k=k)
         return docs
     
+    def _cached_suggestion(self, query_vector: np.ndarray) -> Optional[str]:
+        """
+        Look up a suggestion made for a semantically similar query.
+        
+        Args:
+            query_vector: L2-normalized query embedding of shape (1, d)
+            
+        Returns:
+            The cached suggestion, or None if no cached query is similar enough
+        """
+        if self._suggestion_index is None or self._suggestion_index.ntotal == 0:
+            return None
+        
+        scores, ids = self._suggestion_index.search(query_vector, 1)
+        if scores[0, 0] < SUGGESTION_CACHE_MIN_SIMILARITY:
+            return None
+        
+        suggestion_id = int(ids[0, 0])
+        self._suggestions.move_to_end(suggestion_id)
+        return self._suggestions[suggestion_id]
+    
+    def _cache_suggestion(self, query_vector: np.ndarray, suggestion: str):
+        """
+        Add a suggestion to the semantic cache, evicting the least recently used
+        one once the cache is full.
+        
+        Args:
+            query_vector: L2-normalized query embedding of shape (1, d)
+            suggestion: The suggestion generated for the query
+        """
+        if self._suggestion_index is None:
+            self._suggestion_index = faiss.IndexIDMap(faiss.IndexFlatIP(query_vector.shape[1]))
+        
+        suggestion_id = self._next_suggestion_id
+        self._next_suggestion_id += 1
+        self._suggestion_index.add_with_ids(query_vector, np.array([suggestion_id], dtype=np.int64))
+        self._suggestions[suggestion_id] = suggestion
+        
+        if len(self._suggestions) > SUGGESTION_CACHE_SIZE:
+            evicted_id, _ = self._suggestions.popitem(last=False)
+            self._suggestion_index.remove_ids(np.array([evicted_id], dtype=np.int64))
+    
     def get_resolution_suggestion(self, ticket: Dict[str, Any]) -> str:
         """
         Get a resolution suggestion for a ticket based on similar past tickets.
@@ -200,13 +634,21 @@ class KnowledgeRetriever:
             A suggested resolution
         """
         # Create a query from the ticket
-        query = f"""
-        Subject: {ticket.get('subject')}
-        Description: {ticket.get('description', 'No description provided')}
-        """
+        query = self._format_query_text(ticket)
+        
+        # Nothing to draw on yet, so don't spend an embedding call on the query
+        if not self._has_documents():
+            return "No similar tickets found in the knowledge base."
+        
+        # Reuse the suggestion for a near-identical ticket answered before
+        query_vector = self._cached_embed([query])
+        faiss.normalize_L2(query_vector)
+        cached = self._cached_suggestion(query_vector)
+        if cached is not None:
+            return cached
         
         # Retrieve similar tickets
-        similar_tickets = self.retrieve_similar_tickets(query)
+        similar_tickets = self.retrieve_similar_tickets(query, query_vector=query_vector)
         
         if not similar_tickets:
             return "No similar tickets found in the knowledge base."
@@ -214,36 +656,14 @@ class KnowledgeRetriever:
         # Create a context from the similar tickets
         context = "\n\n".join([doc.page_content for doc in similar_tickets])
         
-        # Create an LLM to generate a resolution suggestion
-        llm = ChatGroq(model=os.getenv("LLM_MODEL", "llama3-70b-8192"), temperature=0)
-        
-        # Create a prompt
-        prompt = ChatPromptTemplate.from_template(
-            """You are an expert cloud support analyst. Based on the current ticket and similar past tickets,
-            suggest a resolution for the current ticket.
-            
-            Current Ticket:
-            Subject: {subject}
-            Description: {description}
-            
-            Similar Past Tickets:
-            {context}
-            
-            Provide a concise resolution suggestion that could help resolve the current ticket.
-            Include specific steps if applicable.
-            """
-        )
-        
-        # Create the chain
-        chain = prompt | llm | StrOutputParser()
-        
         # Generate the resolution suggestion
-        resolution = chain.invoke({
+        resolution = self._suggestion_chain.invoke({
             "subject": ticket.get('subject'),
             "description": ticket.get('description', 'No description provided'),
             "context": context
         })
         
+        self._cache_suggestion(query_vector, resolution)
         return resolution
 
 if __name__ == "__main__":
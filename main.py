@@ -1,9 +1,10 @@
 from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 import os
-import requests
+import httpx
 import json
 from datetime import datetime, timedelta, timezone
 import logging
@@ -11,6 +12,8 @@ from dotenv import load_dotenv
 import asyncio
 import sys
 import os
+from operator import itemgetter
+from contextlib import asynccontextmanager
 
 # Add the parent directory to the path to import from agents
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -43,8 +46,29 @@ STATUS_MAP = {
 # Import the alert resolution agent
 from agents.alert_resolution_agent import run_alert_resolution
 
-# Create FastAPI app
-app = FastAPI(title="Cloud Ticket Resolution System API")
+# Pooled keep-alive client for FreshService calls, open while the app runs
+client: Optional[httpx.AsyncClient] = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open the FreshService client on startup and close it on shutdown"""
+    global client
+    client = httpx.AsyncClient(
+        auth=auth,
+        limits=httpx.Limits(max_keepalive_connections=20),
+        timeout=httpx.Timeout(30.0)
+    )
+    try:
+        yield
+    finally:
+        await client.aclose()
+
+# Create FastAPI app; responses are serialized with orjson
+app = FastAPI(
+    title="Cloud Ticket Resolution System API",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
+)
 
 # Add CORS middleware
 app.add_middleware(
@@ -80,19 +104,43 @@ class AgentAction(BaseModel):
     action: str  # "close", "update", "escalate"
     details: Optional[Dict[str, Any]] = None
 
+# Alert pair fields returned by the alert endpoints
+PAIR_FIELDS = ("firing_id", "firing_subject", "resolved_id", "resolved_subject", "time_diff_minutes")
+_get_pair_fields = itemgetter(*PAIR_FIELDS)
+
+# Last ticket list response per (hours_ago, per_page): (url, ETag, tickets)
+_ticket_list_cache: Dict[tuple, tuple] = {}
+
 # Helper functions
 def to_ist(dt_utc):
     ist_offset = timedelta(hours=5, minutes=30)
     return dt_utc + ist_offset
 
+def pair_summaries(pairs):
+    """Reduce matched alert pairs to the fields returned by the API"""
+    return [dict(zip(PAIR_FIELDS, _get_pair_fields(pair))) for pair in pairs]
+
 async def fetch_tickets(hours_ago=2, per_page=50):
-    """Fetch tickets updated since the specified hours ago"""
+    """Fetch tickets updated since the specified hours ago
+    
+    The cutoff is rounded down to the minute, so polls within the same minute
+    request the same URL and can be answered 304 Not Modified against the
+    ETag of the previous response.
+    """
     try:
         time_ago = datetime.now(timezone.utc) - timedelta(hours=hours_ago)
-        updated_since = time_ago.strftime("%Y-%m-%dT%H:%M:%SZ")
+        updated_since = time_ago.strftime("%Y-%m-%dT%H:%M:00Z")
         
         url = f"{BASE_URL}?updated_since={updated_since}&per_page={per_page}"
-        response = requests.get(url, auth=auth)
+        cached = _ticket_list_cache.get((hours_ago, per_page))
+        headers = {}
+        if cached and cached[0] == url:
+            headers["If-None-Match"] = cached[1]
+        response = await client.get(url, headers=headers)
+        
+        if response.status_code == 304 and headers:
+            logger.info(f"Tickets not modified, reusing {len(cached[2])} tickets")
+            return cached[2]
         
         if response.status_code != 200:
             logger.error(f"Failed to fetch tickets: {response.status_code} - {response.text}")
@@ -101,6 +149,10 @@ async def fetch_tickets(hours_ago=2, per_page=50):
         data = response.json()
         tickets = data.get("tickets", [])
         logger.info(f"Fetched {len(tickets)} tickets")
+        
+        etag = response.headers.get("ETag")
+        if etag:
+            _ticket_list_cache[(hours_ago, per_page)] = (url, etag, tickets)
         return tickets
     except Exception as e:
         logger.error(f"Error fetching tickets: {str(e)}")
@@ -110,11 +162,10 @@ async def update_ticket(ticket_id: int, update_data: dict):
     """Update a ticket in FreshService"""
     try:
         url = f"{BASE_URL}/{ticket_id}"
-        response = requests.put(
+        response = await client.put(
             url, 
-            auth=auth, 
             headers={"Content-Type": "application/json"}, 
-            data=json.dumps(update_data)
+            content=json.dumps(update_data)
         )
         
         if response.status_code == 200:
@@ -136,11 +187,10 @@ async def add_note_to_ticket(ticket_id: int, note_content: str, is_private: bool
             "private": is_private
         }
         
-        response = requests.post(
+        response = await client.post(
             url,
-            auth=auth,
             headers={"Content-Type": "application/json"},
-            data=json.dumps(payload)
+            content=json.dumps(payload)
         )
         
         if response.status_code == 201:
@@ -169,7 +219,7 @@ async def get_ticket(ticket_id: int):
     """Get a specific ticket by ID"""
     try:
         url = f"{BASE_URL}/{ticket_id}"
-        response = requests.get(url, auth=auth)
+        response = await client.get(url)
         
         if response.status_code != 200:
             raise HTTPException(status_code=response.status_code, detail=f"Failed to fetch ticket: {response.text}")
@@ -264,16 +314,13 @@ async def agent_action(action: AgentAction, background_tasks: BackgroundTasks):
         logger.error(f"Error processing agent action: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error processing agent action: {str(e)}")
 
-@app.post("/alerts/resolve", response_model=Dict[str, Any])
+@app.post("/alerts/resolve-summary", response_model=Dict[str, Any])
 async def resolve_alert_pairs(hours: int = Query(24, description="Number of hours to look back for tickets")):
     """Run the alert resolution agent to automatically close paired alert tickets"""
     try:
-        # Run in a background task to avoid blocking
-        def run_resolution():
-            return run_alert_resolution(hours)
-        
-        # Execute the alert resolution process
-        summary = run_resolution()
+        # Execute the alert resolution process in a worker thread, so the
+        # blocking ticket fetches and closes don't stall the event loop
+        summary = await asyncio.to_thread(run_alert_resolution, hours)
         
         return {
             "success": True,
@@ -289,7 +336,7 @@ async def get_alert_resolution_summary(hours: int = Query(24, description="Numbe
     """Get a summary of alert pairs without taking action"""
     try:
         # Import necessary functions
-        from agents.alert_resolution_agent import fetch_recent_tickets, categorize_tickets, match_alert_pairs, subjects_match, AlertResolutionState
+        from agents.alert_resolution_agent import fetch_recent_tickets, categorize_tickets, match_alert_pairs, AlertResolutionState
         
         # Create initial state
         initial_state = AlertResolutionState({
@@ -301,10 +348,14 @@ async def get_alert_resolution_summary(hours: int = Query(24, description="Numbe
             "manual_review_tickets": []
         })
         
-        # Run the first three steps of the process
-        state = fetch_recent_tickets(initial_state)
-        state = categorize_tickets(state)
-        state = match_alert_pairs(state)
+        # Run the first three steps of the process in a worker thread, as the
+        # ticket fetch blocks
+        def run_matching():
+            state = fetch_recent_tickets(initial_state)
+            state = categorize_tickets(state)
+            return match_alert_pairs(state)
+        
+        state = await asyncio.to_thread(run_matching)
         
         # Return the summary
         return {
@@ -313,24 +364,8 @@ async def get_alert_resolution_summary(hours: int = Query(24, description="Numbe
             "resolved_alerts": len(state["resolved_alerts"]),
             "matched_pairs": len(state["matched_pairs"]),
             "manual_review_tickets": len(state["manual_review_tickets"]),
-            "pairs_for_auto_close": [
-                {
-                    "firing_id": pair["firing_id"],
-                    "firing_subject": pair["firing_subject"],
-                    "resolved_id": pair["resolved_id"],
-                    "resolved_subject": pair["resolved_subject"],
-                    "time_diff_minutes": pair["time_diff_minutes"]
-                } for pair in state["matched_pairs"]
-            ],
-            "pairs_for_manual_review": [
-                {
-                    "firing_id": pair["firing_id"],
-                    "firing_subject": pair["firing_subject"],
-                    "resolved_id": pair["resolved_id"],
-                    "resolved_subject": pair["resolved_subject"],
-                    "time_diff_minutes": pair["time_diff_minutes"]
-                } for pair in state["manual_review_tickets"]
-            ]
+            "pairs_for_auto_close": pair_summaries(state["matched_pairs"]),
+            "pairs_for_manual_review": pair_summaries(state["manual_review_tickets"])
         }
     except Exception as e:
         logger.error(f"Error getting alert resolution summary: {str(e)}")
@@ -340,14 +375,11 @@ async def get_alert_resolution_summary(hours: int = Query(24, description="Numbe
 async def resolve_alert_tickets(hours: int = Query(24, description="Number of hours to look back for tickets")):
     """Run the alert resolution agent to auto-close matched alert pairs"""
     try:
-        # Import necessary functions
-        from agents.alert_resolution_agent import run_alert_resolution, subjects_match
-        
         logger.info(f"Starting alert resolution for the last {hours} hours")
         
         # Run the alert resolution agent with explicit try/except
         try:
-            result = run_alert_resolution(hours=hours)
+            result = await asyncio.to_thread(run_alert_resolution, hours=hours)
             logger.info(f"Alert resolution completed successfully, processing results")
         except Exception as agent_error:
             logger.error(f"Error in alert resolution agent: {str(agent_error)}")